@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# benchmark.py
+
+# Times the extraction and generation hot paths of hextract.py on synthetic hRESTS documents.
+# Every run happens in a throwaway workspace; imported XSDs are served from local files or a loopback HTTP server.
+
+# Libraries
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from functools import partial
+import argparse, json, os, platform, shutil, statistics, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from lxml import etree
+import hextract, xsdcache, settings, renderers, fetch
+
+CONFIG = """[XPATH QUERIES]
+service=//div[1]
+operation=//*[contains(@class, 'operation')]
+method=//*[contains(@class, 'method')]
+endpoint=//*[contains(@class, 'endpoint')]
+input=//*[contains(@class, 'input')]
+output=//*[contains(@class, 'output')]
+param=//*[contains(@class, 'param')]
+
+[WSDL 2.0 ATTRIBUTES]
+serviceName=Bench
+targetNamespace=http://localhost/bench
+
+[IMPORTED XSD]
+{imports}
+[CUSTOM ATTRIBUTES]
+operationName=id
+binding=data-binding
+type=data-type
+minOccurs=data-minoccurs
+maxOccurs=data-maxoccurs
+message=data-message
+"""
+
+METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH"]
+TYPES = ["string", "int", "boolean", "dateTime", "decimal", "anyUri"]
+
+# Generate an XSD declaring the messages imported from it
+def generateXsd(index, messages):
+	xsd = ['<?xml version="1.0"?>\n<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" targetNamespace="http://localhost/bench/xsd%d">\n' % index]
+	for message in messages:
+		xsd.append('\t<xsd:element name="%s">\n\t\t<xsd:complexType>\n\t\t\t<xsd:sequence>\n\t\t\t\t<xsd:element name="value" type="xsd:string"/>\n\t\t\t</xsd:sequence>\n\t\t</xsd:complexType>\n\t</xsd:element>\n' % message)
+	xsd.append('</xsd:schema>\n')
+	return "".join(xsd)
+
+# Generate an hRESTS document; every other message is imported when there are XSDs to import from
+def generateDocument(operations, params, endpoints, xsds):
+	html = ['<html><body><div class="service">\n']
+	imported = [[] for i in range(xsds)]
+	for i in range(operations):
+		endpoint = i % endpoints
+		html.append('<div class="operation" id="op%d">\n' % i)
+		html.append('\t<span class="method">%s</span>\n' % METHODS[i % len(METHODS)])
+		html.append('\t<code class="endpoint" data-binding="Endpoint%d">http://localhost/bench/resource%d</code>\n' % (endpoint, endpoint))
+		for direction in ("input", "output"):
+			if xsds > 0 and i % 2 == 1:
+				xsd = i % xsds
+				message = "Op%d%s" % (i, direction.capitalize())
+				imported[xsd].append(message)
+				html.append('\t<div class="%s" data-message="xsd%d:%s">\n' % (direction, xsd, message))
+			else:
+				html.append('\t<div class="%s" data-message="op%d%s">\n' % (direction, i, direction.capitalize()))
+			for j in range(params):
+				html.append('\t\t<span class="param" data-type="%s" data-minoccurs="0" data-maxoccurs="1">%s%d</span>\n' % (TYPES[j % len(TYPES)], direction, j))
+			html.append('\t</div>\n')
+		html.append('</div>\n')
+	html.append('</div></body></html>\n')
+	return "".join(html), imported
+
+# Static file handler that doesn't log every request
+class QuietHandler(SimpleHTTPRequestHandler):
+	def log_message(self, format, *args):
+		pass
+
+# Serve a directory over loopback HTTP from a background thread
+def startServer(directory):
+	handler = partial(QuietHandler, directory=directory)
+	server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	return server
+
+# Create the workspace (config, xsd, wsdl and run directories) and return the document to extract
+def prepareWorkspace(workspace, options):
+	document, imported = generateDocument(options.operations, options.params, options.endpoints, options.xsds)
+	for name in ("config", "xsd", "wsdl", "run"):
+		os.makedirs(os.path.join(workspace, name))
+	for i in range(options.xsds):
+		with open(os.path.join(workspace, "xsd", "bench%d.xsd" % i), "w") as f:
+			f.write(generateXsd(i, imported[i]))
+
+	server = None
+	if options.xsd_source == "http" and options.xsds > 0:
+		server = startServer(os.path.join(workspace, "xsd"))
+		location = "http://127.0.0.1:%d/bench%%d.xsd" % server.server_address[1]
+	else:
+		location = os.path.join(workspace, "xsd", "bench%d.xsd")
+	imports = "".join("xsd%d=http://localhost/bench/xsd%d,%s\n" % (i, i, location % i) for i in range(options.xsds))
+	with open(os.path.join(workspace, "config", "config.ini"), "w") as f:
+		f.write(CONFIG.format(imports=imports))
+	return document, imported, server
+
+# Time fn over the configured number of repeats
+def measure(fn, repeat, setup=None):
+	runs = []
+	for i in range(repeat):
+		if setup is not None:
+			setup()
+		start = time.perf_counter()
+		fn()
+		runs.append(time.perf_counter() - start)
+	return {"runs": runs, "min": min(runs), "median": statistics.median(runs), "mean": statistics.mean(runs)}
+
+# Forget the schemas loaded by previous runs, in memory and on disk
+def clearSchemaCache():
+	xsdcache.schemas.clear()
+	xsdcache.failures.clear()
+	shutil.rmtree(xsdcache.CACHE_DIR, ignore_errors=True)
+
+# Run every benchmark and return the report
+def runBenchmarks(options):
+	workspace = tempfile.mkdtemp(prefix="hextract-bench-")
+	cwd = os.getcwd()
+	server = None
+	try:
+		document, imported, server = prepareWorkspace(workspace, options)
+		os.chdir(os.path.join(workspace, "run"))
+		xsdcache.CACHE_DIR = hextract.SCHEMA_CACHE_DIR
+		# Keep schema warnings printed by xsdcache.py out of the report
+		stdout = sys.stdout
+		sys.stdout = open(os.devnull, "w")
+		try:
+			results = {}
+			# Configs are parsed once per process and reused while the file is unchanged
+			results["generateDictionary.cold"] = measure(hextract.generateDictionary, options.repeat, setup=settings.configs.clear)
+			results["generateDictionary"] = measure(hextract.generateDictionary, options.repeat)
+			hrests_dict = hextract.generateDictionary()
+
+			# Schemas are loaded on first use, so extraction is timed once with a cold cache and then warm
+			results["html2resourcesxpath.cold"] = measure(lambda: hextract.html2resourcesxpath(document, dict(hrests_dict)), options.repeat, setup=clearSchemaCache)
+			results["html2resourcesxpath"] = measure(lambda: hextract.html2resourcesxpath(document, dict(hrests_dict)), options.repeat)
+
+			page_dict = dict(hrests_dict)
+			resources = hextract.html2resourcesxpath(document, page_dict)
+			results["generateWSDL2"] = measure(lambda: hextract.generateWSDL2(resources, page_dict), options.repeat)
+			# Every format from one extraction, to compare with the WSDL 2.0 document alone
+			results["renderAll"] = measure(lambda: renderers.renderAll(resources, page_dict, sorted(renderers.available())), options.repeat)
+
+			if options.xsds > 0:
+				namespace, schemaLocation = hrests_dict["importedXsd"]["xsd0"]
+				message = imported[0][-1] if imported[0] else "missing"
+				results["messageExistInXSD.cold"] = measure(lambda: hextract.messageExistInXSD(message, schemaLocation, namespace), options.repeat, setup=clearSchemaCache)
+				results["messageExistInXSD"] = measure(lambda: hextract.messageExistInXSD(message, schemaLocation, namespace), options.repeat)
+		finally:
+			sys.stdout.close()
+			sys.stdout = stdout
+	finally:
+		os.chdir(cwd)
+		fetch.close()
+		if server is not None:
+			server.shutdown()
+			server.server_close()
+		shutil.rmtree(workspace, ignore_errors=True)
+
+	return {
+		"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+		"python": platform.python_version(),
+		"lxml": ".".join(str(v) for v in etree.LXML_VERSION),
+		"libxml2": ".".join(str(v) for v in etree.LIBXML_VERSION),
+		"parameters": {
+			"operations": options.operations,
+			"params": options.params,
+			"endpoints": options.endpoints,
+			"xsds": options.xsds,
+			"xsdSource": options.xsd_source,
+			"repeat": options.repeat,
+			"documentBytes": len(document.encode("utf-8")),
+		},
+		"results": results,
+	}
+
+# Main Program
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark hextract.py on a synthetic hRESTS document.")
+	parser.add_argument("--operations", type=int, default=200, help="operations in the document (default: 200)")
+	parser.add_argument("--params", type=int, default=5, help="params per input and output message (default: 5)")
+	parser.add_argument("--endpoints", type=int, default=20, help="distinct endpoints (default: 20)")
+	parser.add_argument("--xsds", type=int, default=2, help="imported XSDs, declaring every other operation's messages (default: 2)")
+	parser.add_argument("--xsd-source", choices=["file", "http"], default="file", help="serve imported XSDs from local files or a loopback HTTP server (default: file)")
+	parser.add_argument("--repeat", type=int, default=5, help="runs per benchmark (default: 5)")
+	parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+	options = parser.parse_args()
+	if options.operations < 1 or options.endpoints < 1 or options.params < 0 or options.xsds < 0 or options.repeat < 1:
+		parser.error("--operations, --endpoints and --repeat must be positive, --params and --xsds can't be negative")
+
+	report = runBenchmarks(options)
+	if options.output:
+		with open(options.output, "w") as f:
+			json.dump(report, f, indent=1)
+	else:
+		json.dump(report, sys.stdout, indent=1)
+		print()
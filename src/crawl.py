@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# crawl.py
+
+# Discovers hRESTS pages by following the links of sites from seed URLs. Each page is parsed once with
+# html.document_fromstring, tested with the service and operation queries of its config, and its same-site links
+# are queued up to a depth cap. Requests to a host are spaced by a delay and honour its robots.txt. The frontier and
+# the URLs already seen are saved in a state file, so an interrupted crawl resumes where it stopped.
+
+# Libraries
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from lxml import etree
+from lxml import html
+import os, threading, time
+import fetch, settings, state, stats
+
+# Crawl state of previous runs
+CRAWL_FILE = "../state/crawl.json"
+
+# Bumped whenever the crawl state changes shape, so older states are ignored
+STATE_VERSION = 1
+
+# Links followed from a seed, and seconds between two requests to one host
+MAX_DEPTH = 3
+HOST_DELAY = 1.0
+
+# Crawled pages between two saves of the crawl state
+SAVE_EVERY = 50
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Extensions of links that can't be HTML pages, so they aren't fetched
+SKIPPED_EXTENSIONS = frozenset([".css", ".js", ".json", ".xml", ".xsd", ".wsdl", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".pdf", ".zip", ".gz", ".tar", ".mp3", ".mp4", ".woff", ".woff2", ".ttf"])
+
+# Links of a page, except those the page asks not to follow
+LINKS = etree.XPath("//a[@href and not(contains(concat(' ', normalize-space(@rel), ' '), ' nofollow '))]/@href | //area[@href]/@href")
+BASE = etree.XPath("//base/@href")
+
+# Remove the . and .. segments of a URL path
+def removeDotSegments(path):
+	segments = []
+	for segment in path.split("/"):
+		if segment == "..":
+			if len(segments) > 1:
+				segments.pop()
+		elif segment != ".":
+			segments.append(segment)
+	if path.endswith(("/.", "/..")):
+		segments.append("")
+	return "/".join(segments)
+
+# Return url, resolved against base, in the form used to tell URLs apart: lowercase scheme and host, no default port,
+# no dot segments and no fragment. Anything but an http(s) URL returns None.
+def normalize(url, base=None):
+	if base is not None:
+		url = urljoin(base, url.strip())
+	parts = urlsplit(url)
+	scheme = parts.scheme.lower()
+	if scheme not in DEFAULT_PORTS or not parts.hostname:
+		return None
+	host = parts.hostname
+	if ":" in host:
+		host = "[" + host + "]"
+	try:
+		port = parts.port
+	except ValueError:
+		return None
+	netloc = host if port is None or port == DEFAULT_PORTS[scheme] else host + ":" + str(port)
+	return urlunsplit((scheme, netloc, removeDotSegments(parts.path) or "/", parts.query, ""))
+
+# Return the host, with its port, a normalized URL belongs to
+def hostOf(url):
+	return urlsplit(url).netloc
+
+# Check whether a parsed page holds hRESTS markup for config: a service with at least one operation
+def isHrests(root, config):
+	queries = config["queries"]
+	services = queries["service"](root)
+	return len(services) > 0 and len(queries["operation"](services[0])) > 0
+
+class Crawler:
+	def __init__(self, configs, fetcher, path=CRAWL_FILE, maxDepth=MAX_DEPTH, delay=HOST_DELAY, perHost=1, maxPages=None, robots=True, log=print):
+		self.configs = configs
+		self.fetcher = fetcher
+		self.path = path
+		self.maxDepth = maxDepth
+		self.delay = delay
+		self.perHost = perHost
+		self.maxPages = maxPages
+		self.robots = robots
+		self.log = log
+		# Hosts links are followed to, URLs ever queued, URLs left to crawl with their depth, and the hRESTS pages found
+		self.sites = set()
+		self.seen = set()
+		self.frontier = {}
+		self.found = {}
+		self.crawled = 0
+		self.failed = 0
+		# Per host: the URLs waiting, the requests in flight, the time of the next request, the delay and robots.txt
+		self.queues = {}
+		self.inflight = {}
+		self.next = {}
+		self.delays = {}
+		self.rules = {}
+		self.lock = threading.Lock()
+
+	# Resume the crawl saved in the state file, if any
+	def load(self):
+		saved = state.loadState(self.path)
+		if saved.get("version") != STATE_VERSION:
+			return False
+		self.sites.update(saved["sites"])
+		self.seen.update(saved["seen"])
+		self.found.update(saved["found"])
+		self.crawled = saved["crawled"]
+		for url, depth in saved["frontier"]:
+			self.queue(url, depth)
+		return True
+
+	def save(self):
+		with self.lock:
+			saved = {
+				"version": STATE_VERSION,
+				"sites": sorted(self.sites),
+				"seen": sorted(self.seen),
+				"frontier": [[url, depth] for url, depth in self.frontier.items()],
+				"found": self.found,
+				"crawled": self.crawled,
+			}
+		state.saveState(saved, self.path)
+
+	# Queue a URL to crawl at depth; a URL is only crawled once
+	def add(self, url, depth):
+		with self.lock:
+			if url in self.seen:
+				return False
+			self.seen.add(url)
+			self.queue(url, depth)
+		return True
+
+	def queue(self, url, depth):
+		self.frontier[url] = depth
+		self.queues.setdefault(hostOf(url), deque()).append(url)
+
+	# Start crawling from seed URLs, whose hosts are the sites links are followed to
+	def seed(self, urls):
+		for url in urls:
+			normalized = normalize(url)
+			if normalized is None:
+				raise ValueError("Can't crawl " + url + ", only http and https URLs can.")
+			self.sites.add(hostOf(normalized))
+			self.add(normalized, 0)
+
+	# Read the robots.txt of a host once; when it can't be fetched, everything is allowed
+	def robotsOf(self, url):
+		host = hostOf(url)
+		with self.lock:
+			if host in self.rules:
+				return self.rules[host]
+		rules = RobotFileParser()
+		try:
+			response = self.fetcher.get(urlsplit(url).scheme + "://" + host + "/robots.txt")
+		except fetch.FetchError:
+			rules.allow_all = True
+		else:
+			if response.status_code in (401, 403):
+				rules.disallow_all = True
+			elif response.status_code >= 400:
+				rules.allow_all = True
+			else:
+				rules.parse(response.text.splitlines())
+		with self.lock:
+			self.rules[host] = rules
+			# A Crawl-delay longer than ours is honoured
+			self.delays[host] = max(self.delay, rules.crawl_delay("*") or 0)
+		return rules
+
+	# Fetch a page and return whether it is an hRESTS page, its address after redirects and the same-site links to follow
+	def visit(self, url, depth):
+		if self.robots and not self.robotsOf(url).can_fetch("*", url):
+			stats.count("crawl_disallowed")
+			return False, url, []
+		with stats.timed("fetch"):
+			response = self.fetcher.get(url)
+		stats.count("pages_crawled")
+		response.raise_for_status()
+		contentType = response.headers.get("Content-Type", "")
+		final = normalize(response.url) or url
+		if (contentType and "html" not in contentType.lower()) or hostOf(final) not in self.sites:
+			return False, final, []
+		try:
+			with stats.timed("parse"):
+				root = html.document_fromstring(response.text)
+		except etree.ParserError:
+			return False, final, []
+
+		try:
+			config = settings.select(self.configs, final)
+		except settings.ConfigError:
+			config = None
+		found = config is not None and isHrests(root, config)
+
+		links = []
+		if depth < self.maxDepth:
+			base = BASE(root)
+			base = urljoin(final, base[0].strip()) if base else final
+			for href in LINKS(root):
+				link = normalize(href, base)
+				if link is not None and hostOf(link) in self.sites and os.path.splitext(urlsplit(link).path)[1].lower() not in SKIPPED_EXTENSIONS:
+					links.append(link)
+		return found, final, links
+
+	# Check whether maxPages pages were crawled, counting those in flight
+	def exhausted(self, running=0):
+		return self.maxPages is not None and self.crawled + running >= self.maxPages
+
+	# Take the next URLs whose hosts may be requested now, and return them with the time the next host is ready
+	def schedule(self, running):
+		ready = []
+		now = time.monotonic()
+		wakeup = None
+		with self.lock:
+			for host, queue in self.queues.items():
+				if not queue or self.inflight.get(host, 0) >= self.perHost:
+					continue
+				if self.next.get(host, 0) > now:
+					wakeup = min(wakeup or self.next[host], self.next[host])
+					continue
+				if self.exhausted(running + len(ready)):
+					break
+				url = queue.popleft()
+				self.inflight[host] = self.inflight.get(host, 0) + 1
+				self.next[host] = now + self.delays.get(host, self.delay)
+				ready.append((url, self.frontier[url]))
+		return ready, wakeup
+
+	# Crawl until the frontier is empty or maxPages pages were crawled, and return the hRESTS pages found
+	def run(self, workers=8):
+		executor = ThreadPoolExecutor(max_workers=workers)
+		running = {}
+		try:
+			while True:
+				ready, wakeup = self.schedule(len(running))
+				for url, depth in ready:
+					running[executor.submit(self.visit, url, depth)] = (url, depth)
+				if not running:
+					if wakeup is None or self.exhausted():
+						break
+					time.sleep(max(0, wakeup - time.monotonic()))
+					continue
+				done, pending = wait(running, timeout=None if wakeup is None else max(0, wakeup - time.monotonic()), return_when=FIRST_COMPLETED)
+				for future in done:
+					url, depth = running.pop(future)
+					self.complete(future, url, depth)
+		except KeyboardInterrupt:
+			executor.shutdown(wait=True, cancel_futures=True)
+			self.save()
+			raise
+		executor.shutdown()
+		self.save()
+		return self.found
+
+	# Record a crawled page and queue its links
+	def complete(self, future, url, depth):
+		try:
+			found, final, links = future.result()
+		except Exception as e:
+			found, final, links = False, url, []
+			self.failed += 1
+			stats.count("crawl_errors")
+			self.log("FAILED " + url + ": " + (str(e) or type(e).__name__))
+		with self.lock:
+			self.frontier.pop(url, None)
+			self.inflight[hostOf(url)] -= 1
+			self.crawled += 1
+			crawled = self.crawled
+			# A redirect target is the same page as the URL it was reached from
+			self.seen.add(final)
+			if found and final not in self.found:
+				self.found[final] = depth
+			else:
+				found = False
+		if found:
+			stats.count("hrests_pages_found")
+			self.log("HRESTS " + final + " (depth %d)" % depth)
+		for link in links:
+			self.add(link, depth + 1)
+		if crawled % SAVE_EVERY == 0:
+			self.save()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# diff.py
+
+# Compares the contract extracted from a page with the one extracted last time. Only what ends up in the WSDL 2.0
+# document is compared: operations, methods, endpoints, bindings, message names and params with their min/maxOccurs.
+
+# Libraries
+import json
+
+# Compared fields of a param, in the order of model.Param.asList()
+PARAM_FIELDS = ["name", "type", "minOccurs", "maxOccurs"]
+
+# Compared fields of an operation besides its messages
+OPERATION_FIELDS = ["method", "endpoint", "binding"]
+
+# Return the contract of extracted resources as a compact JSON-serializable dictionary of the operations of each name.
+# Pages may give several operations the same name, on different methods or endpoints, so each name holds a list.
+def snapshot(resources):
+	operations = {}
+	for op in resources.operations:
+		operations.setdefault(op.name, []).append({
+			"method": op.method,
+			"endpoint": op.endpoint,
+			"binding": op.binding,
+			"input": messageSnapshot(op.input),
+			"output": messageSnapshot(op.output),
+		})
+	return operations
+
+def messageSnapshot(message):
+	return {"message": message.name, "params": [param.asList() for param in message.params]}
+
+# Serialize a snapshot the same way every time, so equal contracts hash equally
+def dumps(operations):
+	return json.dumps(operations, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def loads(content):
+	return json.loads(content.decode("utf-8"))
+
+# Return the operations of a name in a snapshot; snapshots of earlier versions held a single one
+def entriesOf(value):
+	if value is None:
+		return []
+	return [value] if isinstance(value, dict) else value
+
+# Pair the old and new operations of a name: first those on the same method and endpoint, then the others in order.
+# Return the pairs and the operations left over on each side.
+def matchOperations(old, new):
+	old = list(old)
+	new = list(new)
+	pairs = []
+	for entry in list(new):
+		match = next((candidate for candidate in old if candidate["method"] == entry["method"] and candidate["endpoint"] == entry["endpoint"]), None)
+		if match is not None:
+			old.remove(match)
+			new.remove(entry)
+			pairs.append((match, entry))
+	while old and new:
+		pairs.append((old.pop(0), new.pop(0)))
+	return pairs, old, new
+
+# Return how an operation is named in a report: by its name, unless the name is shared, then with its method and endpoint
+def label(name, entry, shared):
+	return name + " " + entry["method"] + " " + entry["endpoint"] if shared else name
+
+# Compare two snapshots and return the change report, empty when the contracts are the same
+def compare(old, new):
+	report = {}
+	added = []
+	removed = []
+	changed = {}
+	for name in sorted(set(old) | set(new)):
+		oldEntries = entriesOf(old.get(name))
+		newEntries = entriesOf(new.get(name))
+		shared = len(oldEntries) > 1 or len(newEntries) > 1
+		pairs, removedEntries, addedEntries = matchOperations(oldEntries, newEntries)
+		for oldEntry, newEntry in pairs:
+			changes = compareOperation(oldEntry, newEntry)
+			if changes:
+				changed[label(name, newEntry, shared)] = changes
+		added.extend(label(name, entry, shared) for entry in addedEntries)
+		removed.extend(label(name, entry, shared) for entry in removedEntries)
+	if added:
+		report["added"] = added
+	if removed:
+		report["removed"] = removed
+	if changed:
+		report["changed"] = changed
+	return report
+
+def compareOperation(old, new):
+	changes = {}
+	for field in OPERATION_FIELDS:
+		if old[field] != new[field]:
+			changes[field] = [old[field], new[field]]
+	for direction in ("input", "output"):
+		messageChanges = compareMessage(old[direction], new[direction])
+		if messageChanges:
+			changes[direction] = messageChanges
+	return changes
+
+def compareMessage(old, new):
+	changes = {}
+	if old["message"] != new["message"]:
+		changes["message"] = [old["message"], new["message"]]
+	oldParams = dict((param[0], param) for param in old["params"])
+	newParams = dict((param[0], param) for param in new["params"])
+	added = [name for name in newParams if name not in oldParams]
+	removed = [name for name in oldParams if name not in newParams]
+	changed = {}
+	for name in newParams:
+		if name in oldParams:
+			for i, field in enumerate(PARAM_FIELDS):
+				if oldParams[name][i] != newParams[name][i]:
+					changed.setdefault(name, {})[field] = [oldParams[name][i], newParams[name][i]]
+	if added:
+		changes["addedParams"] = added
+	if removed:
+		changes["removedParams"] = removed
+	if changed:
+		changes["changedParams"] = changed
+	# Params form a sequence, so their order is part of the contract
+	order = [param[0] for param in old["params"] if param[0] in newParams]
+	if order != [param[0] for param in new["params"] if param[0] in oldParams]:
+		changes["paramOrder"] = [[param[0] for param in old["params"]], [param[0] for param in new["params"]]]
+	return changes
+
+# Summarize a change report as "+added -removed ~changed operations"
+def summarize(report):
+	return "+%d -%d ~%d operations" % (len(report.get("added", [])), len(report.get("removed", [])), len(report.get("changed", {})))
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# fetch.py
+
+# Fetches hRESTS pages and imported schemas on an asyncio event loop running in a background thread, so the
+# batch workers, the server and xsdcache.py share its per-host limits, retries and in-flight requests.
+# aiohttp is used when it is installed; otherwise requests run in the loop's executor.
+
+# Libraries
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import asyncio, os, tempfile, threading
+import stats
+
+try:
+	import aiohttp
+except ImportError:
+	aiohttp = None
+	import requests
+	from requests.adapters import HTTPAdapter
+
+try:
+	import brotli
+except ImportError:
+	try:
+		import brotlicffi as brotli
+	except ImportError:
+		brotli = None
+
+# Seconds to wait for a whole response
+FETCH_TIMEOUT = 30
+
+# Attempts per request, and the delay before the first retry (doubled on each retry)
+FETCH_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+# Concurrent requests to one host
+PER_HOST = 8
+
+# Encodings the server may compress responses with; brotli needs the brotli package
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+
+# Bytes read at once when a response is written to a file
+CHUNK_SIZE = 1024 * 1024
+
+# Status codes worth retrying
+RETRY_STATUS = frozenset([429, 500, 502, 503, 504])
+
+# Fetcher shared by the whole process, created by default()
+shared = None
+sharedPid = None
+sharedLock = threading.Lock()
+
+class FetchError(Exception):
+	def __init__(self, url, message, status=None):
+		Exception.__init__(self, url, message, status)
+		self.url = url
+		self.message = message
+		self.status = status
+
+	def __str__(self):
+		return self.message
+
+# Fetched response, with the attributes of requests' responses that the callers use. A response fetched by getFile()
+# has an empty content and its body in file, a temporary file positioned at its start.
+class Response:
+	__slots__ = ("url", "status_code", "headers", "content", "encoding", "file")
+
+	def __init__(self, url, status_code, headers, content, encoding, file=None):
+		self.url = url
+		self.status_code = status_code
+		self.headers = headers
+		self.content = content
+		self.encoding = encoding
+		self.file = file
+
+	@property
+	def text(self):
+		return self.content.decode(self.encoding or "iso-8859-1", "replace")
+
+	def raise_for_status(self):
+		if self.status_code >= 400:
+			raise FetchError(self.url, "HTTP %d for %s" % (self.status_code, self.url), self.status_code)
+
+class Fetcher:
+	def __init__(self, perHost=PER_HOST, timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES, backoff=RETRY_BACKOFF):
+		self.perHost = perHost
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.hosts = {}
+		self.inflight = {}
+		self.session = None
+		self.loop = asyncio.new_event_loop()
+		if aiohttp is None:
+			# Blocking requests need a thread each; the per-host semaphores bound how many run at once
+			self.loop.set_default_executor(ThreadPoolExecutor(max_workers=perHost * 4))
+		self.thread = threading.Thread(target=self.loop.run_forever, name="fetch", daemon=True)
+		self.thread.start()
+
+	# Fetch url from any thread except the fetcher's own
+	def get(self, url, headers=None):
+		return asyncio.run_coroutine_threadsafe(self.fetch(url, headers), self.loop).result()
+
+	# Fetch url into a temporary file rather than memory, for pages too large to hold. Such a download isn't shared
+	# with identical requests and, as it may take long, is only bounded by the timeout between two reads.
+	def getFile(self, url, headers=None):
+		return asyncio.run_coroutine_threadsafe(self.fetchWithRetries(url, headers or {}, True), self.loop).result()
+
+	# Fetch every url concurrently, returning a response or the exception raised for each
+	def getAll(self, urls, headers=None):
+		async def fetchAll():
+			return await asyncio.gather(*[self.fetch(url, headers) for url in urls], return_exceptions=True)
+		return asyncio.run_coroutine_threadsafe(fetchAll(), self.loop).result()
+
+	# Fetch url on the fetcher's loop; identical requests already in flight share one response
+	async def fetch(self, url, headers=None):
+		key = (url, tuple(sorted((headers or {}).items())))
+		task = self.inflight.get(key)
+		if task is None:
+			task = self.loop.create_task(self.fetchWithRetries(url, headers or {}))
+			self.inflight[key] = task
+			task.add_done_callback(lambda done: self.inflight.pop(key, None))
+		else:
+			stats.count("fetch_deduplicated")
+		# A caller giving up mustn't cancel the request for the others
+		return await asyncio.shield(task)
+
+	async def fetchWithRetries(self, url, headers, spool=False):
+		headers = dict(headers)
+		headers.setdefault("Accept-Encoding", ACCEPT_ENCODING)
+		host = urlparse(url).netloc
+		if host not in self.hosts:
+			self.hosts[host] = asyncio.Semaphore(self.perHost)
+
+		delay = self.backoff
+		for attempt in range(1, self.retries + 1):
+			try:
+				async with self.hosts[host]:
+					response = await asyncio.wait_for(self.request(url, headers, spool), None if spool else self.timeout)
+			except asyncio.TimeoutError:
+				error = FetchError(url, "Timed out after %ds fetching %s" % (self.timeout, url))
+			except Exception as e:
+				error = FetchError(url, "Couldn't fetch " + url + ": " + (str(e) or type(e).__name__))
+			else:
+				if response.status_code not in RETRY_STATUS:
+					return response
+				error = None
+			if attempt == self.retries:
+				if error is not None:
+					raise error
+				return response
+			if error is None and response.file is not None:
+				response.file.close()
+			stats.count("fetch_retries")
+			await asyncio.sleep(delay)
+			delay *= 2
+
+	async def request(self, url, headers, spool=False):
+		if aiohttp is not None:
+			if self.session is None:
+				connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.perHost)
+				self.session = aiohttp.ClientSession(connector=connector)
+			async with self.session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(sock_read=self.timeout) if spool else None) as response:
+				if not spool:
+					content = await response.read()
+					return Response(str(response.url), response.status, response.headers, content, response.charset)
+				file = tempfile.TemporaryFile()
+				try:
+					async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+						file.write(chunk)
+				except BaseException:
+					file.close()
+					raise
+				file.seek(0)
+				return Response(str(response.url), response.status, response.headers, b"", response.charset, file)
+		if self.session is None:
+			self.session = requests.Session()
+			adapter = HTTPAdapter(pool_connections=self.perHost, pool_maxsize=self.perHost * 4)
+			self.session.mount("http://", adapter)
+			self.session.mount("https://", adapter)
+		if not spool:
+			response = await self.loop.run_in_executor(None, lambda: self.session.get(url, headers=headers, timeout=self.timeout))
+			return Response(response.url, response.status_code, response.headers, response.content, response.encoding)
+		return await self.loop.run_in_executor(None, lambda: self.download(url, headers))
+
+	# Write the body of a blocking request to a temporary file, decoded as it is read
+	def download(self, url, headers):
+		with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+			file = tempfile.TemporaryFile()
+			try:
+				for chunk in response.iter_content(CHUNK_SIZE):
+					file.write(chunk)
+			except BaseException:
+				file.close()
+				raise
+		file.seek(0)
+		return Response(response.url, response.status_code, response.headers, b"", response.encoding, file)
+
+	# Close the connections and stop the loop
+	def close(self):
+		async def closeSession():
+			if self.session is not None and aiohttp is not None:
+				await self.session.close()
+		asyncio.run_coroutine_threadsafe(closeSession(), self.loop).result()
+		if self.session is not None and aiohttp is None:
+			self.session.close()
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join()
+		self.loop.close()
+
+# Return the fetcher shared by the process, creating it on first use (and again in forked worker processes)
+def default():
+	global shared, sharedPid
+	with sharedLock:
+		if shared is None or sharedPid != os.getpid():
+			shared = Fetcher(PER_HOST, FETCH_TIMEOUT, FETCH_RETRIES, RETRY_BACKOFF)
+			sharedPid = os.getpid()
+		return shared
+
+# Close the shared fetcher, if this process created one
+def close():
+	global shared
+	with sharedLock:
+		if shared is not None and sharedPid == os.getpid():
+			shared.close()
+		shared = None
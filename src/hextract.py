@@ -6,39 +6,100 @@
 # Libraries
 from lxml import etree
 from lxml import html
-from lxml.etree import tostring
-from lxml.builder import E
 from urllib.parse import urlparse
-from io import StringIO
-import requests, sys, http.client, urllib, os, shutil
-import save
-
-# Generate hRESTS dictionary using config.ini
-def generateDictionary():
-	hrests_dict = {}
-	
-	importing_xsd = False
-	hrests_dict["importedXsd"] = {}
-	hrests_dict["localMessage"] = False
-	
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import Counter
+import sys, argparse, multiprocessing, time, json, re
+import save, xsdcache, state, stats, fetch, settings, store, diff, model, renderers, crawl
+
+# Namespaces of the generated WSDL 2.0 documents
+WSDL_NS = "http://www.w3.org/ns/wsdl"
+WHTTP_NS = "http://www.w3.org/ns/wsdl/http"
+WSDLX_NS = "http://www.w3.org/ns/wsdl-extensions"
+XSD_NS = "http://www.w3.org/2001/XMLSchema"
+
+# Default locations of the configuration and of the generated documents, relative to src/
+CONFIG_FILE = "../config/config.ini"
+OUTPUT_DIR = "../wsdl"
+SCHEMA_CACHE_DIR = "../cache/xsd"
+CONFIG_CACHE_DIR = "../cache/config"
+
+# REST methods of an operation
+METHODS = frozenset(['GET', 'POST', 'PUT', 'DELETE', 'PATCH'])
+
+# Datatypes of message params
+XSD_TYPES = frozenset([
+	'anyUri',
+	'base64Binary',
+	'boolean',
+	'byte',
+	'date',
+	'dateTime',
+	'dateTimeStamp',
+	'dayTimeDuration',
+	'decimal',
+	'double',
+	'float',
+	'gDay',
+	'gMonth',
+	'gMonthDay',
+	'gYear',
+	'gYearMonth',
+	'hexBinary',
+	'int',
+	'integer',
+	'language',
+	'long',
+	'Name',
+	'NCName',
+	'NMTOKEN',
+	'negativeInteger',
+	'nonNegativeInteger',
+	'nonPositiveInteger',
+	'normalizedString',
+	'positiveInteger',
+	'short',
+	'string',
+	'time',
+	'token',
+	'unsignedByte',
+	'unsignedInt',
+	'unsignedLong',
+	'unsignedShort',
+	'yearMonthDuration',
+	'precisionDecimal',
+	'duration',
+	'QName',
+	'ENTITY',
+	'ID',
+	'IDREF',
+	'NOTATION',
+	'IDREFS',
+	'ENTITIES',
+	'NMTOKENS'])
+
+# Param occurrence attributes of the [CUSTOM ATTRIBUTES] section
+OCCURS = ["minOccurs", "maxOccurs"]
+
+# Default message name suffixes, by message direction
+MESSAGE_SUFFIXES = {"input": "Request", "output": "Response"}
+
+# Configurations of an extraction worker process, set by initWorker
+workerConfigs = None
+
+# Load an hRESTS configuration file into a frozen config with compiled queries
+def loadConfig(path=CONFIG_FILE):
+	return settings.load(path)
+
+# Generate hRESTS dictionary using config.ini, creating a default one if it is missing
+def generateDictionary(path=CONFIG_FILE):
 	try:
-		f = open("../config/config.ini", "r")
-		for line in f:
-			if len(line) > 1 and line[0] != '[':
-				k, v = line.split('=', 1)
-				if importing_xsd:
-					hrests_dict["importedXsd"][k] = v.rstrip().lower().replace(" ", "").split(',')
-				else:
-					hrests_dict[k] = v.rstrip().lower()
-			elif "IMPORTED XSD" in line:
-				importing_xsd = True
-			elif len(line) > 1:
-				importing_xsd = False
-		f.close()
+		return loadConfig(path)
 	except IOError:
-		print("No configuration file found. Generating default configuration file at ../config/config.ini.")
+		print("No configuration file found. Generating default configuration file at " + path + ".")
 		print("Please set your xpath queries and other attributes before running this program again.")
-		f = open("../config/config.ini", 'w')
+		f = open(path, 'w')
 		f.write("[XPATH QUERIES]\n")
 		f.write("service=\n")
 		f.write("operation=\n")
@@ -65,433 +126,959 @@ def generateDictionary():
 		f.close()
 
 		sys.exit(1)
+	except Exception as e:
+		print("Error in " + path + ": " + str(e))
+		sys.exit(1)
 
-	return hrests_dict
-
-# Generate WSDL 2.0 document
-def generateWSDL2(resources):
-	xml = """<?xml version="1.0"?> 
-<wsdl:description xmlns:wsdl="http://www.w3.org/ns/wsdl"
-	"""
-	xml += "targetNamespace=\"" + hrests_dict["targetNamespace"] + "\"\n"
-	xml += "	xmlns:tns=\"" + hrests_dict['targetNamespace'] + "\"\n"
-	if hrests_dict["importedXsd"]:
-		for xsd in hrests_dict["importedXsd"]:
-			xml += "	xmlns:" + xsd + "=\"" + hrests_dict["importedXsd"][xsd][0] + "\"\n"
-	xml += """	xmlns:whttp="http://www.w3.org/ns/wsdl/http"
-	xmlns:wsdlx="http://www.w3.org/ns/wsdl-extensions">
+# Load every configuration of paths (files, or directories of config*.ini files) for the command line, exiting on errors
+def generateDictionaries(paths):
+	try:
+		configs = settings.loadAll(paths)
+	except IOError as e:
+		print("No configuration file found: " + str(e))
+		sys.exit(1)
+	except settings.ConfigError as e:
+		print("Error in " + str(e))
+		sys.exit(1)
+	if len(configs) == 0:
+		print("No configuration file found in " + ", ".join(paths) + ".")
+		sys.exit(1)
+	return configs
 
-	"""
-	xml += """<wsdl:types>
-"""
-	if hrests_dict["importedXsd"]:
-		for xsd in hrests_dict["importedXsd"]:
-			xml += "		<xsd:import xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\"\n"
-			xml += "			namespace=\"" + hrests_dict["importedXsd"][xsd][0] + "\"\n"
-			xml += "			schemaLocation=\"" + hrests_dict["importedXsd"][xsd][1] + "\"/>\n"
-
-	if hrests_dict["localMessage"]:
-		xml += "		<xsd:schema xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\"\n"
-		xml += "			targetNamespace=\"" + hrests_dict["targetNamespace"] + "\">\n"
-		for op in resources["operations"]:
-			if ":" not in op["input"]["message"]:
-				xml += "			<xsd:element name=\"" + op["input"]["message"] + "\">\n"
-				xml += "				<xsd:complexType>\n"
-				xml += "					<xsd:sequence>\n"
-				for inp in op["input"]["params"]:
-					xml += "						<xsd:element name=\"" + inp["name"] + "\" type=\"xsd:" + inp["type"] + "\""
-					if "minOccurs" in inp:
-						xml += " minOccurs=\"" + inp["minOccurs"] + "\""
-					if "maxOccurs" in inp:
-						xml += " maxOccurs=\"" + inp["maxOccurs"] + "\""
-					xml += "/>\n"
-				xml += """					</xsd:sequence>		
-				</xsd:complexType>
-	  	</xsd:element>
-"""
-	
-		if ":" not in op["output"]["message"]:
-			xml += "			<xsd:element name=\"" + op["output"]["message"] + "\">\n"
-			xml += "				<xsd:complexType>\n"
-			xml += "					<xsd:sequence>\n"
-			for out in op["output"]["params"]:
-				xml += "						<xsd:element name=\"" + out["name"] + "\" type=\"xsd:" + out["type"] + "\""
-				if "minOccurs" in out:
-					xml += " minOccurs=\"" + out["minOccurs"] + "\""
-				if "maxOccurs" in out:
-					xml += " maxOccurs=\"" + out["maxOccurs"] + "\""
-				xml += "/>\n"
-			xml += """					</xsd:sequence>		
-				</xsd:complexType>
-	  	</xsd:element>
-"""
-		xml += """		</xsd:schema>
-"""
-	xml += """	</wsdl:types>
-
-  """
-
-	xml += "<wsdl:interface name=\"" + hrests_dict["serviceName"] + "Interface\">\n"
-	for op in resources["operations"]:
-		xml += "		<wsdl:operation name=\"" + op["name"] + "\"\n"
-		xml += """			pattern="http://www.w3.org/ns/wsdl/in-out"
-			"""
-		if op["method"] == "GET":
-			xml += """wsdlx:safe="true"
-			"""
-		xml += """style="http://www.w3.org/ns/wsdl/style/iri">
-			"""
-		if ":" not in op["input"]["message"]:
-			xml += "<wsdl:input element=\"tns:" + op["input"]["message"] + "\"/>\n"
-		else:
-			xml += "<wsdl:input element=\"" + op["input"]["message"] + "\"/>\n"
+# Start a new indented line in the WSDL 2.0 output
+def newline(xf, depth):
+	xf.write("\n" + "\t" * depth)
 
-		if ":" not in op["output"]["message"]:
-			xml += "			<wsdl:output element=\"tns:" + op["output"]["message"] + "\"/>\n"
-		else:
-			xml += "			<wsdl:output element=\"" + op["output"]["message"] + "\"/>\n"
-		xml += "		</wsdl:operation>\n"
-	xml += """	</wsdl:interface>
+# Write the xsd:element declaring a local message
+def writeMessageElement(xf, message):
+	newline(xf, 3)
+	with xf.element("{%s}element" % XSD_NS, name=message.name):
+		newline(xf, 4)
+		with xf.element("{%s}complexType" % XSD_NS):
+			newline(xf, 5)
+			with xf.element("{%s}sequence" % XSD_NS):
+				for param in message.params:
+					attrib = {"name": param.name, "type": "xsd:" + param.type}
+					if param.minOccurs is not None:
+						attrib["minOccurs"] = param.minOccurs
+					if param.maxOccurs is not None:
+						attrib["maxOccurs"] = param.maxOccurs
+					newline(xf, 6)
+					with xf.element("{%s}element" % XSD_NS, attrib):
+						pass
+				newline(xf, 5)
+			newline(xf, 4)
+		newline(xf, 3)
 
-	"""
+# Group operations by endpoint in order of first appearance and resolve each endpoint's binding names
+def indexEndpoints(resources, hrests_dict):
+	bindings = []
+	byEndpoint = {}
+	for op in resources.operations:
+		binding = byEndpoint.get(op.endpoint)
+		if binding is None:
+			binding = {"endpoint": op.endpoint, "name": None, "operations": []}
+			byEndpoint[op.endpoint] = binding
+			bindings.append(binding)
+		# The first operation of the endpoint carrying a binding name names the binding
+		if binding["name"] is None and op.binding is not None:
+			binding["name"] = op.binding
+		binding["operations"].append(op)
 
-	endpoints = set(op["endpoint"] for op in resources["operations"])
 	counter = 0
-	for endpoint in endpoints:
-		opBinding = None
-		try:
-			opBinding = next (op for op in resources["operations"] if op["endpoint"] == endpoint and "binding" in op)
-		except:
-			opBinding = next (op for op in resources["operations"] if op["endpoint"] == endpoint)
-		binding = ""
-		httpEndpoint = ""
-		if "binding" in opBinding:
-			binding = opBinding["binding"] + "HTTPBinding"
-			httpEndpoint = opBinding["binding"] + "HTTPEndpoint"
+	for binding in bindings:
+		if binding["name"] is not None:
+			binding["binding"] = binding["name"] + "HTTPBinding"
+			binding["httpEndpoint"] = binding["name"] + "HTTPEndpoint"
 		else:
-			binding = hrests_dict["serviceName"] + "HTTPBinding" + str(counter)
-			httpEndpoint = hrests_dict["serviceName"] + "HTTPEndpoint" + str(counter)
-			print("Warning: no binding name specified for " + op["name"] + ", resolved using default name " + binding)
+			binding["binding"] = hrests_dict["serviceName"] + "HTTPBinding" + str(counter)
+			binding["httpEndpoint"] = hrests_dict["serviceName"] + "HTTPEndpoint" + str(counter)
 			counter += 1
-		xml += "<wsdl:binding name=\"" + binding + "\"\n"
-		xml += "		type=\"http://www.w3.org/ns/wsdl/http\"\n"
-		xml += "		interface=\"tns:" + hrests_dict["serviceName"] + "Interface\">\n"
-
-		for op in resources["operations"]:
-			if op["endpoint"] == endpoint:
-				op["binding"] = binding
-				op["httpEndpoint"] = httpEndpoint
-				xml += "		<wsdl:operation ref=\"tns:" + op["name"] + "\" whttp:method=\"" + op["method"] + "\"/>\n"
-		xml += """  </wsdl:binding>
-
-  """
-
-	xml += "<wsdl:service name=\"" + hrests_dict["serviceName"] + "\" interface=\"tns:" + hrests_dict["serviceName"] + "Interface\">\n"
-	for endpoint in endpoints:
-		opBinding = next (op for op in resources["operations"] if op["endpoint"] == endpoint)
-		xml += "		<wsdl:endpoint name=\"" + opBinding["httpEndpoint"] + "\"\n"
-		xml += "			binding=\"tns:" + opBinding["binding"] + "\"\n"  
-		xml += "			address=\"" + endpoint + "\">\n"
-		xml += "		</wsdl:endpoint>\n"
-	xml += """	</wsdl:service>
-
-</wsdl:description>"""
-
-	if "schemaLocation" not in resources:
-		f = open("../wsdl/" + hrests_dict["serviceName"] + ".wsdl", 'w')
-		f.write(xml)
-		f.close()
-	else:
-		try:
-			xsd = requests.get(hrests_dict["schemaLocation"]).text
+	return bindings
 
-			if not os.path.exists("../wsdl/" + hrests_dict["serviceName"]):
-				os.makedirs("../wsdl/" + hrests_dict["serviceName"])
+# Write WSDL 2.0 document to a file name or binary file-like sink, serializing it incrementally
+def writeWSDL2(resources, hrests_dict, sink):
+	nsmap = {"wsdl": WSDL_NS, "tns": hrests_dict["targetNamespace"]}
+	# lxml declares a single prefix per namespace, so an imported prefix whose namespace is already
+	# mapped, to tns or another import, is written as the prefix declared for that namespace
+	prefixes = {}
+	for xsd in hrests_dict["importedXsd"]:
+		namespace = hrests_dict["importedXsd"][xsd][0]
+		prefixes[xsd] = next((prefix for prefix in nsmap if nsmap[prefix] == namespace), xsd)
+		if prefixes[xsd] == xsd:
+			nsmap[xsd] = namespace
+	nsmap["whttp"] = WHTTP_NS
+	nsmap["wsdlx"] = WSDLX_NS
 
-			f = open("../wsdl/" + hrests_dict["serviceName"] + "/" + hrests_dict["serviceName"].lower() + ".xsd", 'w')
-			f.write(xsd.replace('\r', ''))
-			f.close()
+	with etree.xmlfile(sink, encoding="utf-8") as xf:
+		xf.write_declaration()
+		with xf.element("{%s}description" % WSDL_NS, nsmap=nsmap, targetNamespace=hrests_dict["targetNamespace"]):
+			newline(xf, 1)
+			with xf.element("{%s}types" % WSDL_NS):
+				for xsd in hrests_dict["importedXsd"]:
+					newline(xf, 2)
+					with xf.element("{%s}import" % XSD_NS, nsmap={"xsd": XSD_NS}, namespace=hrests_dict["importedXsd"][xsd][0], schemaLocation=hrests_dict["importedXsd"][xsd][1]):
+						pass
 
-			f = open("../wsdl/" + hrests_dict["serviceName"] + "/" + hrests_dict["serviceName"] + ".wsdl", 'w')
-			f.write(xml)
-			f.close()
+				# Messages without an XSD prefix are declared in a local schema
+				localMessages = [message for op in resources.operations for message in op.messages() if ":" not in message.name]
+				if localMessages:
+					newline(xf, 2)
+					with xf.element("{%s}schema" % XSD_NS, nsmap={"xsd": XSD_NS}, targetNamespace=hrests_dict["targetNamespace"]):
+						for message in localMessages:
+							writeMessageElement(xf, message)
+						newline(xf, 2)
+				newline(xf, 1)
 
-			shutil.make_archive("../wsdl/" + hrests_dict["serviceName"] + "/" + hrests_dict["serviceName"], 'zip', "../wsdl/" + hrests_dict["serviceName"])
+			newline(xf, 0)
+			newline(xf, 1)
+			with xf.element("{%s}interface" % WSDL_NS, name=hrests_dict["serviceName"] + "Interface"):
+				for op in resources.operations:
+					attrib = {"name": op.name, "pattern": "http://www.w3.org/ns/wsdl/in-out"}
+					if op.method == "GET":
+						attrib["{%s}safe" % WSDLX_NS] = "true"
+					attrib["style"] = "http://www.w3.org/ns/wsdl/style/iri"
+					newline(xf, 2)
+					with xf.element("{%s}operation" % WSDL_NS, attrib):
+						for tag, message in (("input", op.input.name), ("output", op.output.name)):
+							newline(xf, 3)
+							prefix, _, name = message.rpartition(":")
+							with xf.element("{%s}%s" % (WSDL_NS, tag), element=prefixes.get(prefix, prefix or "tns") + ":" + name):
+								pass
+						newline(xf, 2)
+				newline(xf, 1)
 
-		except Exception as e:
-			print(e)
-			sys.exit()
+			bindings = indexEndpoints(resources, hrests_dict)
+			for binding in bindings:
+				newline(xf, 0)
+				newline(xf, 1)
+				with xf.element("{%s}binding" % WSDL_NS, name=binding["binding"], type="http://www.w3.org/ns/wsdl/http", interface="tns:" + hrests_dict["serviceName"] + "Interface"):
+					for op in binding["operations"]:
+						newline(xf, 2)
+						with xf.element("{%s}operation" % WSDL_NS, {"ref": "tns:" + op.name, "{%s}method" % WHTTP_NS: op.method}):
+							pass
+					newline(xf, 1)
 
+			newline(xf, 0)
+			newline(xf, 1)
+			with xf.element("{%s}service" % WSDL_NS, name=hrests_dict["serviceName"], interface="tns:" + hrests_dict["serviceName"] + "Interface"):
+				for binding in bindings:
+					newline(xf, 2)
+					with xf.element("{%s}endpoint" % WSDL_NS, name=binding["httpEndpoint"], binding="tns:" + binding["binding"], address=binding["endpoint"]):
+						pass
+				newline(xf, 1)
+			newline(xf, 0)
 
-# Extract html document micorformats to resources using the xpath
-def html2resourcesxpath(html_text, hrests_dict):
-	root = html.document_fromstring(html_text)
-
-	methods = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
-	xsdTypes = ['anyUri',
-							'base64Binary',
-							'boolean',
-							'byte',
-							'date',
-							'dateTime',
-							'dateTimeStamp',
-							'dayTimeDuration',
-							'decimal',
-							'double',
-							'float',
-							'gDay',
-							'gMonth',
-							'gMonthDay',
-							'gYear',
-							'gYearMonth',
-							'hexBinary',
-							'int',
-							'integer',
-							'language',
-							'long',
-							'Name',
-							'NCName',
-							'NMTOKEN',
-							'negativeInteger',
-							'nonNegativeInteger',
-							'nonPositiveInteger',
-							'normalizedString',
-							'positiveInteger',
-							'short',
-							'string',
-							'time',
-							'token',
-							'unsignedByte',
-							'unsignedInt',
-							'unsignedLong',
-							'unsignedShort',
-							'yearMonthDuration',
-							'precisionDecimal',
-							'duration',
-							'QName',
-							'ENTITY',
-							'ID',
-							'IDREF',
-							'NOTATION',
-							'IDREFS',
-							'ENTITIES',
-							'NMTOKENS']
-	resources = {}
+# Render the WSDL 2.0 document of the resources in memory
+@renderers.register("wsdl", ".wsdl", "application/wsdl+xml", write=writeWSDL2)
+def renderWSDL2(resources, hrests_dict):
+	wsdl = BytesIO()
+	writeWSDL2(resources, hrests_dict, wsdl)
+	return wsdl.getvalue()
+
+# Store the WSDL 2.0 document in outputDir, rendering it unless a worker process already did, and return the artifact to publish
+def generateWSDL2(resources, hrests_dict, wsdl=None, outputDir=OUTPUT_DIR):
+	return generate(resources, hrests_dict, renderers.DEFAULT_FORMATS, {"wsdl": wsdl} if wsdl is not None else None, outputDir)
+
+# Store the documents of every format in outputDir, rendering those a worker process didn't, and return the artifact to publish.
+# The WSDL 2.0 document is written straight to the store rather than rendered in memory.
+def generate(resources, hrests_dict, formats, rendered=None, outputDir=OUTPUT_DIR):
+	rendered = renderers.renderAll(resources, hrests_dict, formats, rendered, stream=True)
+	with stats.timed("store"):
+		return writeArtifact(resources, hrests_dict, rendered, outputDir)
+
+# Store the rendered documents ({format: content or function writing it}) with the imported schema when there is one.
+# The WSDL 2.0 document is published, bundled in a zip with the schema; without it, every document is.
+def writeArtifact(resources, hrests_dict, rendered, outputDir):
+	files = dict((renderers.fileName(name, hrests_dict), content) for name, content in rendered.items())
+	published = None
+	if "wsdl" in rendered:
+		published = [renderers.fileName("wsdl", hrests_dict)]
+	if resources.schemaLocation is not None:
+		schema = xsdcache.getSchema(hrests_dict["schemaLocation"])
+		if schema is None:
+			raise Exception("Couldn't read schema \"" + hrests_dict["schemaLocation"] + "\".")
+		files[hrests_dict["serviceName"].lower() + ".xsd"] = schema["content"].replace(b'\r', b'')
+		if published is not None:
+			published.append(hrests_dict["serviceName"].lower() + ".xsd")
+	return store.putService(outputDir, hrests_dict["serviceName"], hrests_dict["targetNamespace"], files, published)
+
+# Invalid hRESTS document; code, operation and param locate the failure, diagnostics holds the warnings collected before it
+class ExtractionError(Exception):
+	def __init__(self, code, message, operation=None, param=None):
+		Exception.__init__(self, code, message, operation, param)
+		self.code = code
+		self.message = message
+		self.operation = operation
+		self.param = param
+		self.diagnostics = []
+
+	def __str__(self):
+		return self.message
 
+	def asDict(self):
+		return diagnostic("error", self.code, self.message, self.operation, self.param)
+
+# Build a diagnostic entry of the per-document report
+def diagnostic(level, code, message, operation=None, param=None):
+	return {"level": level, "code": code, "operation": operation, "param": param, "message": message}
+
+# Record a warning in the per-document report
+def warn(diagnostics, code, message, operation=None, param=None):
+	diagnostics.append(diagnostic("warning", code, message, operation, param))
+
+# Format a diagnostic the way the command line prints it
+def formatDiagnostic(entry):
+	return ("Warning: " if entry["level"] == "warning" else "Error: ") + entry["message"]
+
+# Return the text of an element and its descendants; elements built by iterparse aren't lxml.html elements and lack text_content()
+def textOf(element):
+	return "".join(element.itertext())
+
+# Extract a param, reading the element's attributes once
+def extractParam(element, opName, direction, hrests_dict, diagnostics):
+	attrib = dict(element.items())
+	name = textOf(element).replace(" ", "")
+	if len(name) == 0:
+		warn(diagnostics, "empty-param-name", direction + " parameter name is empty.", opName)
+	paramType = attrib.get(hrests_dict["type"])
+	if paramType is None:
+		paramType = "string"
+		warn(diagnostics, "default-param-type", "no type specified for " + name + " of " + opName + ", resolved using default type string", opName, name)
+	if paramType not in XSD_TYPES:
+		raise ExtractionError("invalid-param-type", "Error while parsing operation " + opName + ": invalid datatype for param " + name + ".", opName, name)
+	occurrences = []
+	for occurs in OCCURS:
+		value = attrib.get(hrests_dict[occurs])
+		if value is not None and not value.isdigit() and value != "unbounded":
+			raise ExtractionError("invalid-" + occurs.lower(), "Error while parsing operation " + opName + ": " + occurs + " for param " + name + " must be a positive integer.", opName, name)
+		occurrences.append(value)
+	return model.Param(name, paramType, occurrences[0], occurrences[1])
+
+# Extract the input or output message of an operation
+def extractMessage(operation, opName, direction, hrests_dict, queries, diagnostics):
+	defaultName = opName + MESSAGE_SUFFIXES[direction]
+	elements = queries[direction](operation)
+	if len(elements) == 0:
+		warn(diagnostics, "default-message-name", "no message name specified for " + opName + ", resolved using default name " + defaultName, opName)
+		return model.Message(defaultName)
+	element = elements[0]
+
+	name = element.get(hrests_dict["message"])
+	name = name.replace(" ", "") if name is not None else ""
+	if len(name) == 0:
+		name = defaultName
+		warn(diagnostics, "default-message-name", "no message name specified for " + opName + ", resolved using default name " + name, opName)
+
+	# Messages of imported XSDs are checked against their schemas once the whole document is extracted
+	if ":" in name and name.split(':', 1)[0] not in hrests_dict["importedXsd"]:
+		raise ExtractionError("unknown-xsd-prefix", "Error while parsing operation " + opName + ": message " + name + " uses an XSD prefix that isn't imported.", opName)
+
+	return model.Message(name, [extractParam(param, opName, direction, hrests_dict, diagnostics) for param in queries["param"](element)])
+
+# Check the configuration values every extracted document depends on
+def validateConfig(hrests_dict, diagnostics):
+	# resources["service"] = service.get(hrests_dict["serviceName"]).replace(" ", "")
+	if len(hrests_dict["serviceName"]) == 0:
+		raise ExtractionError("invalid-config", "Error while extracting resources: service name can\'t be empty.")
+	# resources["targetNamespace"] = service.get(hrests_dict["targetNamespace"]).replace(" ", "")
+	if len(hrests_dict["targetNamespace"]) == 0:
+		raise ExtractionError("invalid-config", "Error while extracting resources: targetNamespace can\'t be empty.")
+	if urlparse(hrests_dict["targetNamespace"]).scheme == "":
+		raise ExtractionError("invalid-config", "Error while extracting resources: target namespace must be a valid URI.")
+	if hrests_dict["importedXsd"]:
+		for xsd in hrests_dict["importedXsd"]:
+			# print("Warning: XSD Namespace found. Only 1 XSD can be imported.")
+			# resources["xsdnamespace"] = service.get(hrests_dict["xsdnamespace"]).replace(" ", "")
+			if len(hrests_dict["importedXsd"][xsd]) < 2:
+				raise ExtractionError("invalid-config", "Error while extracting resources: Each imported XSD must have namespace and schemaLocation")
+			if urlparse(hrests_dict["importedXsd"][xsd][0]).scheme == "":
+				raise ExtractionError("invalid-config", "Error while extracting resources: xsdNamespace \"" + hrests_dict["importedXsd"][xsd][0] + "\" is not a valid URI.")
+			# resources["schemaLocation"] = service.get(hrests_dict["schemaLocation"]).replace(" ","")
+			if len(hrests_dict["importedXsd"][xsd][1]) == 0:
+				raise ExtractionError("invalid-config", "Error while extracting resources: schemaLocation can\'t be empty.")
+			elif not hrests_dict["importedXsd"][xsd][1].endswith(".xsd") and urlparse(hrests_dict["importedXsd"][xsd][1]).scheme == "":
+				warn(diagnostics, "invalid-schema-location", "schemaLocation \"" + hrests_dict["importedXsd"][xsd][1] + "\" is not of xsd format or valid URI.")
+
+# Return the first element selected by a query, or raise code when there is none
+def first(query, element, code, message, operation=None):
+	elements = query(element)
+	if len(elements) == 0:
+		raise ExtractionError(code, message, operation)
+	return elements[0]
+
+# Extract an operation from its element
+def extractOperation(operation, hrests_dict, queries, diagnostics):
+	name = operation.get(hrests_dict["operationName"])
+	if name is None:
+		raise ExtractionError("missing-operation-name", "Error while parsing operation: no " + hrests_dict["operationName"] + " attribute naming it.")
+	name = name.replace(" ", "")
+	method = textOf(first(queries["method"], operation, "missing-method", "Error while parsing operation " + name + ": no REST method found.", name)).replace(" ", "").upper().strip()
+	if method not in METHODS:
+		raise ExtractionError("invalid-method", "Error while parsing operation " + name + ": invalid REST \"" + method + "\"method.", name)
+	endpoint = first(queries["endpoint"], operation, "missing-endpoint", "Error while parsing operation " + name + ": no endpoint found.", name)
+	address = textOf(endpoint).replace(" ", "").strip()
+	if urlparse(address).scheme == "":
+		raise ExtractionError("invalid-endpoint", "Error while parsing operation " + name + ": endpoint \"" + address + "\" must be a valid URI.", name)
+	binding = endpoint.get(hrests_dict["binding"])
+	if binding:
+		binding = binding.replace(" ", "")
+	if not binding:
+		binding = None
+
+	return model.Operation(name, method, address, binding, extractMessage(operation, name, "input", hrests_dict, queries, diagnostics), extractMessage(operation, name, "output", hrests_dict, queries, diagnostics))
+
+# Check the params of a message against the children its schema declares for it
+def checkParams(op, message, fields, diagnostics):
+	declared = dict((field[0], field) for field in fields)
+	for param in message.params:
+		field = declared.get(param.name)
+		if field is None:
+			warn(diagnostics, "param-not-in-xsd", "param " + param.name + " of " + message.name + " isn't declared by its schema.", op.name, param.name)
+		elif field[1] is not None and field[1].lower() != param.type.lower():
+			warn(diagnostics, "param-type-mismatch", "param " + param.name + " of " + message.name + " is " + param.type + " but its schema declares " + field[1] + ".", op.name, param.name)
+	names = set(param.name for param in message.params)
+	for name, type, minOccurs in fields:
+		if name not in names and minOccurs != "0":
+			warn(diagnostics, "missing-param", "param " + name + " required by the schema of " + message.name + " is missing.", op.name, name)
+
+# Check every message of an imported XSD against the element declarations of its schema, loading the schemas in parallel.
+# Params are also checked against the element's complexType when the config sets checkParams.
+def checkSchemas(resources, hrests_dict, diagnostics):
+	imported = hrests_dict["importedXsd"]
+	references = []
+	for op in resources.operations:
+		for message in op.messages():
+			if ":" in message.name:
+				xsd, name = message.name.split(':', 1)
+				if xsd in imported:
+					references.append((op, message, imported[xsd][0], imported[xsd][1], name))
+	if not references:
+		return
+
+	with stats.timed("xsd_check"):
+		loaded = xsdcache.loadAll(set(reference[3] for reference in references))
+		reported = set()
+		for op, message, namespace, location, name in references:
+			schema = loaded[location]
+			if location not in reported:
+				reported.add(location)
+				if schema is None:
+					warn(diagnostics, "unreadable-schema", "Couldn't read schema \"" + location + "\".")
+				elif schema["error"] is not None:
+					warn(diagnostics, "invalid-schema", "schema \"" + location + "\" doesn't compile: " + schema["error"])
+			if schema is None:
+				continue
+			qname = etree.QName(namespace, name).text
+			if qname not in schema["elements"]:
+				warn(diagnostics, "message-not-in-xsd", "Couldn't find element \"" + name + "\" of namespace \"" + namespace + "\" in \"" + location + "\".", op.name)
+			elif hrests_dict["checkParams"] and schema["elements"][qname] is not None:
+				checkParams(op, message, schema["elements"][qname], diagnostics)
+
+# Report the extracted operations, endpoints whose binding names will be defaulted, and messages missing from their schemas
+def checkResources(resources, hrests_dict, diagnostics):
+	if len(resources.operations) == 0:
+		warn(diagnostics, "no-operations", "no operation found.")
+	named = set(op.endpoint for op in resources.operations if op.binding is not None)
+	for op in resources.operations:
+		if op.endpoint not in named:
+			named.add(op.endpoint)
+			warn(diagnostics, "default-binding-name", "no binding name specified for " + op.name + ", resolved using a default binding name for " + op.endpoint, op.name)
+	checkSchemas(resources, hrests_dict, diagnostics)
+	resources.diagnostics = diagnostics
+	countResources(resources)
+
+# Extract html document micorformats to a model.Service using the xpath.
+# Warnings are returned in its diagnostics; an invalid document raises ExtractionError.
+def html2resourcesxpath(html_text, hrests_dict):
+	diagnostics = []
 	try:
-		service = root.xpath(hrests_dict["service"])[0]
-		# resources["service"] = service.get(hrests_dict["serviceName"]).replace(" ", "")
-		if len(hrests_dict["serviceName"]) == 0:
-			raise Exception("Error while extracting resources: service name can\'t be empty.")
-		# resources["targetNamespace"] = service.get(hrests_dict["targetNamespace"]).replace(" ", "")
-		if len(hrests_dict["targetNamespace"]) == 0:
-			raise Exception("Error while extracting resources: targetNamespace can\'t be empty.")
-		if urlparse(hrests_dict["targetNamespace"]).scheme == "":
-			raise Exception("Error while extracting resources: target namespace must be a valid URI.")
-		if hrests_dict["importedXsd"]:
-			for xsd in hrests_dict["importedXsd"]:
-				# print("Warning: XSD Namespace found. Only 1 XSD can be imported.")
-				# resources["xsdnamespace"] = service.get(hrests_dict["xsdnamespace"]).replace(" ", "")
-				if len(hrests_dict["importedXsd"][xsd]) < 2:
-					raise Exception("Error while extracting resources: Each imported XSD must have namespace and schemaLocation")
-				if urlparse(hrests_dict["importedXsd"][xsd][0]).scheme == "":
-					raise Exception("Error while extracting resources: xsdNamespace \"" + hrests_dict["importedXsd"][xsd][0] + "\" is not a valid URI.")
-				# resources["schemaLocation"] = service.get(hrests_dict["schemaLocation"]).replace(" ","")
-				if len(hrests_dict["importedXsd"][xsd][1]) == 0:
-					raise Exception("Error while extracting resources: schemaLocation can\'t be empty.")
-				elif not hrests_dict["importedXsd"][xsd][1].endswith(".xsd") and urlparse(hrests_dict["importedXsd"][xsd][1]).scheme == "":
-					print("Warning: schemaLocation \"" + hrests_dict["importedXsd"][xsd][1] + "\" is not of xsd format or valid URI.")			
-		resources["operations"] = []
+		with stats.timed("parse"):
+			root = html.document_fromstring(html_text)
+		queries = hrests_dict["queries"]
+		resources = model.Service()
+
+		service = first(queries["service"], root, "missing-service", "Error while extracting resources: no service found.")
+		validateConfig(hrests_dict, diagnostics)
 
 		# if len((hrests_dict["operation"])) > 0:
-		for operation in service.xpath("." + hrests_dict["operation"]):
-			op = {}
-			op["name"] = operation.get(hrests_dict["operationName"]).replace(" ", "")
-			op["method"] = operation.xpath("." + hrests_dict["method"])[0].text_content().replace(" ", "").upper().strip()
-			if op["method"] not in methods:
-				raise Exception("Error while parsing operation " + op["name"] + ": invalid REST \"" + op["method"] + "\"method.")
-			endpoint = operation.xpath("." + hrests_dict["endpoint"])[0]
-			op["endpoint"] = endpoint.text_content().replace(" ", "").strip()
-			if urlparse(op["endpoint"]).scheme == "":
-				raise Exception("Error while parsing operation " + op["name"] + ": endpoint \"" + op["endpoint"] + "\" must be a valid URI.")
-			if endpoint.get(hrests_dict["binding"]):
-				if len(endpoint.get(hrests_dict["binding"]).replace(" ", "")) > 0:
-					op["binding"] = endpoint.get(hrests_dict["binding"]).replace(" ", "")
-
-			op["input"] = {}
-			inpObj = {}
-			inpObj["params"] = []
-			inputs = operation.xpath("." + hrests_dict["input"])
-			if len(inputs) > 0:
-				inputs = inputs[0]
-			else:
-				inputs = None
-			if inputs is not None:
-				if hrests_dict["message"] in inputs.attrib:
-					if len(inputs.get(hrests_dict["message"]).replace(" ", "")) > 0:
-						inpObj["message"] = inputs.get(hrests_dict["message"]).replace(" ", "")
-					else:
-						inpObj["message"] = op["name"] + "Request"
-						print("Warning: no message name specified for " + op["name"] + ", resolved using default name " + inpObj["message"])
-				else:
-					inpObj["message"] = op["name"] + "Request"
-					print("Warning: no message name specified for " + op["name"] + ", resolved using default name " + inpObj["message"])
-
-				if ":" not in inpObj["message"] and not hrests_dict["localMessage"]:
-					hrests_dict["localMessage"] = True
-				elif ":" in inpObj["message"]:
-					xsd, message = inpObj["message"].split(':', 1)
-					if hrests_dict["importedXsd"] and not messageExistInXSD(message, hrests_dict["importedXsd"][xsd][1]):
-						print("Warning: Couldn't find \"" + message + "\" in \"" + hrests_dict["importedXsd"][xsd][1] + "\".")
-
-				for input in inputs.xpath("." + hrests_dict["param"]):
-					inp ={}
-					inp["name"] = input.text_content().replace(" ", "")
-					if len(inp["name"]) == 0:
-						print("Warning: input parameter is empty.")
-					if hrests_dict["type"] in input.attrib:
-						inp["type"] = input.get(hrests_dict["type"])
-					else:
-						inp["type"] = "string"
-						print("Warning: no type specified for " + inp["name"] + " of " + op["name"] + ", resolved using default type string")
-					if inp["type"] not in xsdTypes:
-						raise Exception("Error while parsing operation " + op["name"] + ": invalid datatype for param " + inp["name"] + ".")
-					if hrests_dict["minOccurs"] in input.attrib:
-						inp["minOccurs"] = input.get(hrests_dict["minOccurs"])
-						if not inp["minOccurs"].isdigit() and not inp["minOccurs"] == "unbounded":
-							raise Exception("Error while parsing operation " + op["name"] + ": minOccurs for param " + inp["name"] + " must be a positive integer.")
-					if hrests_dict["maxOccurs"] in input.attrib:
-						inp["maxOccurs"] = input.get(hrests_dict["maxOccurs"])
-						if not inp["maxOccurs"].isdigit() and not inp["maxOccurs"] == "unbounded":
-							raise Exception("Error while parsing operation " + op["name"] + ": maxOccurs for param " + inp["name"] + " must be a positive integer.")
-					inpObj["params"].append(inp)
-			else:
-				inpObj["message"] = op["name"] + "Request"
-				print("Warning: no message name specified for " + op["name"] + ", resolved using default name " + inpObj["message"])
-			op["input"] = inpObj
-
-			op["output"] = {}
-			outObj = {}
-			outObj["params"] = []
-			outputs = operation.xpath("." + hrests_dict["output"])
-			if len(outputs) > 0:
-				outputs = outputs[0]
-			else:
-				outputs = None
-			if outputs is not None:
-				if hrests_dict["message"] in outputs.attrib:
-					if len(outputs.get(hrests_dict["message"]).replace(" ", "")) > 0:
-						outObj["message"] = outputs.get(hrests_dict["message"]).replace(" ", "")
-					else:
-						outObj["message"] = op["name"] + "Response"
-						print("Warning: no message name specified for " + op["name"] + ", resolved using default name " + outObj["message"])
-				else:
-					outObj["message"] = op["name"] + "Response"
-					print("Warning: no message name specified for " + op["name"] + ", resolved using default name " + outObj["message"])	
-				if ":" not in outObj["message"] and not hrests_dict["localMessage"]:
-					hrests_dict["localMessage"] = True
-				elif ":" in outObj["message"]:
-					xsd, message = outObj["message"].split(':', 1)
-					if hrests_dict["importedXsd"] and not messageExistInXSD(message, hrests_dict["importedXsd"][xsd][1]):
-						print("Warning: Couldn't find \"" + message + "\" in \"" + hrests_dict["importedXsd"][xsd][1] + "\".")
-
-				for output in outputs.xpath("." + hrests_dict["param"]):
-					out ={}
-					out["name"] = output.text_content().replace(" ", "")
-					if len(out["name"]) == 0:
-						print("Warning: output parameter name is empty.")
-					if hrests_dict["type"] in output.attrib:
-						out["type"] = output.get(hrests_dict["type"])
-					else:
-						out["type"] = "string"
-						print("Warning: no type specified for " + out["name"] + " of " + op["name"] + ", resolved using default type string")
-					if out["type"] not in xsdTypes:
-						raise Exception("Error while parsing operation " + op["name"] + ": invalid datatype for param " + out["name"] + ".")
-					if hrests_dict["minOccurs"] in output.attrib:
-						out["minOccurs"] = output.get(hrests_dict["minOccurs"])
-						if not out["minOccurs"].isdigit() and not out["minOccurs"] == "unbounded":
-							raise Exception("Error while parsing operation " + op["name"] + ": minOccurs for param " + out["name"] + " must be a positive integer.")
-					if hrests_dict["maxOccurs"] in output.attrib:
-						out["maxOccurs"] = output.get(hrests_dict["maxOccurs"])
-						if not out["maxOccurs"].isdigit() and not out["maxOccurs"] == "unbounded":
-							raise Exception("Error while parsing operation " + op["name"] + ": maxOccurs for param " + out["name"] + " must be a positive integer.")
-					outObj["params"].append(out)
-			else:
-				outObj["message"] = op["name"] + "Response"
-				print("Warning: no message name specified for " + op["name"] + ", resolved using default name " + outObj["message"])
-			op["output"] = outObj
+		with stats.timed("extract"):
+			for operation in queries["operation"](service):
+				resources.operations.append(extractOperation(operation, hrests_dict, queries, diagnostics))
+	except ExtractionError as e:
+		e.diagnostics = diagnostics
+		raise
+	except etree.ParserError as e:
+		error = ExtractionError("unparsable-document", "Error while parsing document: " + str(e))
+		error.diagnostics = diagnostics
+		raise error
 
-			resources["operations"].append(op)
+	checkResources(resources, hrests_dict, diagnostics)
+	return resources
 
-		if len(resources["operations"]) == 0:
-			print("Warning: no operation found.")
-		return resources
+# Count the operations and params of extracted resources
+def countResources(resources):
+	if not stats.enabled:
+		return
+	stats.count("operations_extracted", len(resources.operations))
+	stats.count("params_extracted", resources.paramCount())
 
-	except Exception as e:
-		print(e)
-		print("Check your HTML document.")
-		exc_type, exc_obj, exc_tb = sys.exc_info()
-		fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-		print(exc_type, fname, exc_tb.tb_lineno)
-		print(resources)
-		sys.exit()
-
-# Check if message exist in XSD
-def messageExistInXSD(messageName, schemaLocation):
-	xsd_text = ""
-	if urlparse(schemaLocation).scheme != "":
-		try:
-			xsd_text = str.encode(requests.get(schemaLocation).text)
-		except:
-			print("Error while reading schema \"" + schemaLocation + "\".")
-			return False
-		if isinstance (xsd_text, tuple):
-			print("Error while reading schema \"" + schemaLocation + "\": " + xsd_text[0])
-			print('%s : %s' % (html_text[1], html_text[2]))
+# Functions and operators a predicate tested while streaming may use; they only read the element's attributes
+STREAM_FUNCTIONS = frozenset(["contains", "starts-with", "ends-with", "normalize-space", "concat", "translate", "substring", "substring-before", "substring-after", "string-length", "string", "number", "not", "true", "false", "lower-case", "upper-case"])
+STREAM_OPERATORS = frozenset(["and", "or", "div", "mod"])
+
+# Tokens of a predicate once its string literals are removed: attributes, names, numbers and single characters
+PREDICATE_TOKENS = re.compile(r"@[\w.:*-]+|[A-Za-z_][\w.-]*(?:\s*\()?|\d+(?:\.\d+)?|\S")
+
+# Check whether a predicate only tests attributes of the element, which the parser has read at its start tag.
+# Child elements, text and positions aren't known yet then, so predicates using them can't be streamed.
+def isAttributePredicate(predicate):
+	tokens = PREDICATE_TOKENS.findall(re.sub(r"'[^']*'|\"[^\"]*\"", "''", predicate))
+	attributes = False
+	for token in tokens:
+		if token.startswith("@"):
+			attributes = True
+		elif token.endswith("("):
+			if token[:-1].strip() not in STREAM_FUNCTIONS:
+				return False
+		elif token[0].isalpha() or token[0] == "_":
+			if token not in STREAM_OPERATORS:
+				return False
+		elif not token[0].isdigit() and token not in "()=!<>,+-|'":
 			return False
+	return attributes
+
+# Turn a "//name[predicates]" query into a test of the element itself at its start tag, or return None if it has several
+# steps or predicates testing more than attributes. A trailing [1] is dropped when only the first match is used, as the
+# first element in document order matching the rest is also the first of its siblings.
+def selfQuery(expression, first=False):
+	if not expression.startswith("//"):
+		return None
+	step = expression[2:]
+	predicates = []
+	depth = 0
+	quote = None
+	for i, c in enumerate(step):
+		if quote is not None:
+			if c == quote:
+				quote = None
+		elif c == "'" or c == '"':
+			quote = c
+		elif c == "[":
+			if depth == 0:
+				opened = i
+			depth += 1
+		elif c == "]":
+			depth -= 1
+			if depth == 0:
+				predicates.append(step[opened + 1:i])
+		elif depth == 0 and (c == "/" or c == "|" or (predicates and not c.isspace())):
+			return None
+	if depth != 0:
+		return None
+	name = step[:step.index("[")] if predicates else step
+	if first and predicates and predicates[-1].strip() == "1":
+		predicates.pop()
+	if not all(isAttributePredicate(predicate) for predicate in predicates):
+		return None
+	return etree.XPath("self::" + name.strip() + "".join("[" + predicate + "]" for predicate in predicates))
+
+# Turn an absolute "/name/name" query into a test of the element and its ancestors, or return None if it has predicates
+def pathQuery(expression):
+	if re.match(r"^(/[A-Za-z_][\w.-]*)+$", expression) is None:
+		return None
+	names = expression[1:].split("/")
+	def isAt(element):
+		return [ancestor.tag for ancestor in reversed(list(element.iterancestors()))] + [element.tag] == names
+	return isAt
+
+# Extract operations one at a time while parsing a document too large to hold in memory. As html2resourcesxpath does,
+# only the operations of the first service are extracted and parsing stops at its end. Each operation's subtree, and
+# everything parsed outside operations, is freed once it has been read.
+def iterOperations(source, hrests_dict, diagnostics):
+	validateConfig(hrests_dict, diagnostics)
+	queries = hrests_dict["queries"]
+	isService = selfQuery(hrests_dict["service"], first=True) or pathQuery(hrests_dict["service"])
+	if isService is None:
+		raise ExtractionError("unstreamable-query", "Streaming needs a single-step service query testing attributes only, such as //div[contains(@class, 'service')], or a path such as /html/body, not " + hrests_dict["service"] + ".")
+	isOperation = selfQuery(hrests_dict["operation"])
+	if isOperation is None:
+		raise ExtractionError("unstreamable-query", "Streaming needs a single-step operation query testing attributes only, such as //*[contains(@class, 'operation')], not " + hrests_dict["operation"] + ".")
+
+	service = None
+	# Operations whose end hasn't been parsed yet, only more than one when operations are nested
+	opened = []
+	for event, element in etree.iterparse(source, events=("start", "end"), html=True):
+		if event == "start":
+			if service is None:
+				if isService(element):
+					service = element
+			elif isOperation(element):
+				opened.append(element)
+			continue
+		if element is service:
+			return
+		if opened and opened[-1] is element:
+			opened.pop()
+			yield extractOperation(element, hrests_dict, queries, diagnostics)
+		if opened:
+			# Still inside an operation that hasn't been extracted yet
+			continue
+		element.clear()
+		while element.getprevious() is not None:
+			del element.getparent()[0]
+	raise ExtractionError("missing-service", "Error while extracting resources: no service found.")
+
+# Extract the resources of a large document given as a file name or binary file-like object without building its whole
+# tree. Only the extracted operations are kept, appended as they are parsed; renderers walk them several times.
+def extractStream(source, hrests_dict):
+	diagnostics = []
+	resources = model.Service()
+	try:
+		with stats.timed("extract"):
+			for operation in iterOperations(source, hrests_dict, diagnostics):
+				resources.operations.append(operation)
+	except ExtractionError as e:
+		e.diagnostics = diagnostics
+		raise
+	checkResources(resources, hrests_dict, diagnostics)
+	return resources
+
+# Extract the resources of an hRESTS document given as text or bytes into a model.Service.
+# Warnings are returned in its diagnostics; an invalid document raises ExtractionError.
+def extract(document, hrests_dict):
+	return html2resourcesxpath(document, hrests_dict)
+
+# Check if message is a top-level element of namespace in the XSD at schemaLocation
+def messageExistInXSD(messageName, schemaLocation, namespace):
+	schema = xsdcache.getSchema(schemaLocation)
+	if schema is None:
+		return False
+	return etree.QName(namespace, messageName).text in schema["elements"]
+
+# Load every schema imported by configs, in parallel
+def loadSchemas(configs):
+	xsdcache.loadAll(set(location for config in configs for namespace, location in config["importedXsd"].values()))
+
+# Read the batch URL list from a file or stdin ("-"), skipping blank lines and comments
+def readUrlList(source):
+	if source == "-":
+		lines = sys.stdin.readlines()
 	else:
+		with open(source, "r") as f:
+			lines = f.readlines()
+	urls = []
+	for line in lines:
+		line = line.strip()
+		if len(line) > 0 and line[0] != '#':
+			urls.append(line)
+	return urls
+
+# Set up an extraction worker process with the configurations of the run, profiling its pages into profileDir if given
+def initWorker(configs, schemaCacheDir, profileDir=None):
+	global workerConfigs
+	xsdcache.CACHE_DIR = schemaCacheDir
+	workerConfigs = configs
+	if profileDir is not None:
+		stats.enable(profileDir)
+
+# Extract a page and compare its contract with the previous one, or with none when there is no previous one
+def extractChanges(document, config, previous):
+	resources = extract(document, config)
+	contract = diff.snapshot(resources)
+	return resources, contract, diff.compare(previous or {}, contract)
+
+# Extract the page at url with the configuration at index in a worker process, rendering its documents unless its
+# contract is unchanged
+def extractDocument(url, content, encoding, index, previous, formats):
+	with stats.profiled(url):
+		resources, contract, report = extractChanges(content.decode(encoding or "iso-8859-1", "replace"), workerConfigs[index], previous)
+		rendered = renderers.renderAll(resources, workerConfigs[index], formats) if previous is None or report else None
+	return resources, contract, report, rendered
+
+# Start the pool of extraction processes; configs are pickled without their queries, so each worker compiles its own.
+# Workers are started lazily while the fetcher and batch threads run and may hold locks, so they are started by a
+# fork server rather than forked from this process, where a lock held at fork time would never be released.
+def createProcessPool(processes, configs):
+	return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("forkserver"), initializer=initWorker, initargs=(configs, xsdcache.CACHE_DIR, stats.profileDir))
+
+# Read the contract recorded for a page by the previous run, or None
+def loadSnapshot(entry):
+	if entry.get("snapshot") is None:
+		return None
+	try:
+		with open(entry["snapshot"], "rb") as f:
+			return diff.loads(f.read())
+	except (IOError, ValueError):
+		return None
+
+# Fetch a single page and, unless it, the config and the formats are unchanged since the last run, extract it.
+# Its documents are only generated again, and published, when the extracted contract changed.
+def processUrl(fetcher, hrests_url, configs, pages, publish, processPool, formats=renderers.DEFAULT_FORMATS):
+	start = time.time()
+	formats = list(formats)
+	config = settings.select(configs, hrests_url)
+	configDigest = state.configHash(config)
+	entry = pages.get(hrests_url)
+	reusable = state.isReusable(entry, configDigest) and entry.get("formats", list(renderers.DEFAULT_FORMATS)) == formats
+
+	headers = {}
+	if reusable:
+		if entry.get("etag"):
+			headers["If-None-Match"] = entry["etag"]
+		if entry.get("lastModified"):
+			headers["If-Modified-Since"] = entry["lastModified"]
+	with stats.timed("fetch"):
+		response = fetcher.get(hrests_url, headers)
+	stats.count("pages_fetched")
+	if response.status_code == 304 and reusable:
+		stats.count("pages_not_modified")
+		digest = entry["contentHash"]
+	else:
+		response.raise_for_status()
+		stats.count("bytes_fetched", len(response.content))
+		digest = state.contentHash(response.content)
+
+	result = {"operations": entry["operations"] if reusable else 0, "extracted": False, "changed": False, "changes": None, "artifact": None, "diagnostics": []}
+	if not reusable or digest != entry["contentHash"]:
+		# The previous documents can only be kept if they were generated with the same config and formats
+		previous = loadSnapshot(entry) if reusable else None
+		# Worker processes profile the pages they extract, rather than this thread its wait for them
+		with stats.profiled(hrests_url) if processPool is None else stats.disabledContext:
+			if processPool is None:
+				resources, contract, report = extractChanges(response.text, config, previous)
+				rendered = None
+			else:
+				# Worker processes keep their own stats, so the round trip is timed here
+				with stats.timed("extract"):
+					resources, contract, report, rendered = processPool.submit(extractDocument, hrests_url, response.content, response.encoding, configs.index(config), previous, formats).result()
+				countResources(resources)
+			if previous is not None and not report:
+				stats.count("contracts_unchanged")
+				output = entry["output"]
+				published = entry["published"]
+			else:
+				output = generate(resources, config, formats, rendered)
+				published = False
+			snapshot = store.putBlob(OUTPUT_DIR, diff.dumps(contract), ".json")
+		entry = {"contentHash": digest, "configHash": configDigest, "output": output, "outputHash": store.digestOf(output), "snapshot": snapshot, "formats": formats, "operations": len(resources.operations), "published": published}
+		result["operations"] = entry["operations"]
+		result["extracted"] = True
+		result["changed"] = previous is None or bool(report)
+		result["changes"] = report
+		result["diagnostics"] = resources.diagnostics
+	entry["etag"] = response.headers.get("ETag", entry.get("etag"))
+	entry["lastModified"] = response.headers.get("Last-Modified", entry.get("lastModified"))
+
+	if publish and not entry["published"]:
+		result["artifact"] = entry["output"]
+		result["filename"] = config["serviceName"] + ".wsdl"
+
+	pages[hrests_url] = entry
+	result["elapsed"] = time.time() - start
+	return result
+
+# Extract every URL of the list over a bounded pool of workers
+def runBatch(args):
+	parser = argparse.ArgumentParser(prog=sys.argv[0] + " --batch", description="Extract WSDL 2.0 and other documents from a list of hRESTS URLs.")
+	parser.add_argument("source", help="file with one hRESTS URL per line, or - to read from stdin")
+	parser.add_argument("--config", action="append", help="hRESTS configuration file, or directory of config*.ini files, picked per URL by their [SITE] hosts; can be repeated (default: " + CONFIG_FILE + ")")
+	parser.add_argument("--workers", type=int, default=8, help="number of pages processed concurrently (default: 8)")
+	parser.add_argument("--per-host", type=int, default=fetch.PER_HOST, help="concurrent requests to one host (default: %d)" % fetch.PER_HOST)
+	parser.add_argument("--formats", default=",".join(renderers.DEFAULT_FORMATS), help="comma-separated formats generated from each page, among " + ", ".join(sorted(renderers.RENDERERS)) + " (default: %(default)s)")
+	parser.add_argument("--processes", type=int, default=0, help="number of processes parsing pages and rendering documents, 0 to parse in the fetching threads (default: 0)")
+	parser.add_argument("--publish", action="store_true", help="save new and changed documents to WSO2 Governance Registry")
+	parser.add_argument("--publishers", type=int, default=4, help="number of concurrent uploads with --publish (default: 4)")
+	parser.add_argument("--force", action="store_true", help="re-extract every page even if it is unchanged since the last run")
+	parser.add_argument("--state", default=state.STATE_FILE, help="file recording pages of previous runs (default: " + state.STATE_FILE + ")")
+	parser.add_argument("--stats", help="write stage timings and counters to this file, in Prometheus text format if it ends with .prom and JSON otherwise")
+	parser.add_argument("--profile", help="write a cProfile dump of each extracted page to this directory; needs --workers 1 unless --processes is given")
+	parser.add_argument("--report", help="write each page's status, warnings and error to this JSON file")
+	parser.add_argument("--changes", help="write the contract changes of every re-extracted page to this JSON file")
+	options = parser.parse_args(args)
+	if options.stats or options.profile:
+		stats.enable(options.profile)
+	if options.workers < 1:
+		parser.error("--workers must be at least 1")
+	if options.publishers < 1:
+		parser.error("--publishers must be at least 1")
+	if options.processes < 0:
+		parser.error("--processes can't be negative")
+	if options.per_host < 1:
+		parser.error("--per-host must be at least 1")
+	# Only one page can be profiled at a time in a process, which would serialize the fetching threads
+	if options.profile and options.processes == 0 and options.workers > 1:
+		parser.error("--profile profiles one page at a time, so it needs --workers 1 or --processes N to profile in the worker processes")
+	try:
+		formats = renderers.parseFormats(options.formats)
+	except ValueError as e:
+		parser.error("--formats: " + str(e))
+	# The registry takes WSDL documents
+	if options.publish and "wsdl" not in formats:
+		parser.error("--publish needs the wsdl format")
+
+	urls = readUrlList(options.source)
+	configs = generateDictionaries(options.config or [CONFIG_FILE])
+	if options.publish:
+		# A bad save.ini fails the run now rather than once every page is extracted
 		try:
-			with open('schemaLocation', 'r') as file:
-				xsd_text = file.read()
-		except:
-			print("Error while reading schema \"" + schemaLocation + "\".")
+			save.loadSave()
+		except settings.ConfigError as e:
+			print(e)
 			return False
-	root = etree.fromstring(xsd_text)
-	elm = root.xpath("//*[@name='" + messageName + "']")
-	if len(elm) > 0:
-		return True
-	else:
+	# The shared fetcher is created by the first schema fetched, so its per-host limit is set first
+	fetch.PER_HOST = options.per_host
+	fetcher = fetch.default()
+	loadSchemas(configs)
+	pages = {} if options.force else state.loadState(options.state)
+	processPool = createProcessPool(options.processes, configs) if options.processes > 0 else None
+
+	succeeded = 0
+	failed = 0
+	skipped = 0
+	extracted = 0
+	same = 0
+	published = 0
+	artifacts = {}
+	filenames = {}
+	report = {}
+	changes = {}
+	warnings = Counter()
+	errors = Counter()
+	start = time.time()
+	with ThreadPoolExecutor(max_workers=options.workers) as executor:
+		futures = {executor.submit(processUrl, fetcher, url, configs, pages, options.publish, processPool, formats): url for url in urls}
+		for future in as_completed(futures):
+			url = futures[future]
+			try:
+				result = future.result()
+			# A malformed page only loses that page
+			except ExtractionError as e:
+				failed += 1
+				errors[e.code] += 1
+				warnings.update(entry["code"] for entry in e.diagnostics)
+				report[url] = {"status": "failed", "error": e.asDict(), "diagnostics": e.diagnostics}
+				print("FAILED " + url + ": " + str(e))
+			except Exception as e:
+				failed += 1
+				if isinstance(e, fetch.FetchError):
+					code = "fetch-failed"
+				elif isinstance(e, settings.ConfigError):
+					code = "no-config"
+				else:
+					code = "failed"
+				errors[code] += 1
+				report[url] = {"status": "failed", "error": diagnostic("error", code, str(e) or type(e).__name__), "diagnostics": []}
+				print("FAILED " + url + ": " + (str(e) or type(e).__name__))
+			else:
+				succeeded += 1
+				if result["changed"]:
+					extracted += 1
+				elif result["extracted"]:
+					same += 1
+				else:
+					skipped += 1
+				if result["changes"]:
+					changes[url] = result["changes"]
+				if result["artifact"] is not None:
+					artifacts.setdefault(result["artifact"], []).append(url)
+					filenames[result["artifact"]] = result["filename"]
+				warnings.update(entry["code"] for entry in result["diagnostics"])
+				if result["changed"]:
+					status = "extracted"
+				elif result["extracted"]:
+					status = "same-contract"
+				else:
+					status = "unchanged"
+				report[url] = {"status": status, "error": None, "diagnostics": result["diagnostics"]}
+				summary = diff.summarize(result["changes"]) + ", " if result["changes"] else ""
+				print({"extracted": "OK ", "same-contract": "SAME ", "unchanged": "UNCHANGED "}[status] + url + " (" + str(result["operations"]) + " operations, " + summary + str(len(result["diagnostics"])) + " warnings, %.2fs)" % result["elapsed"])
+	if processPool is not None:
+		processPool.shutdown()
+
+	# Pages sharing an output are uploaded once; the state of the run is saved even if publishing fails
+	try:
+		if artifacts:
+			print()
+			for upload in save.publishArtifacts([(path, filenames[path]) for path in artifacts], workers=options.publishers):
+				if upload["ok"]:
+					published += len(artifacts[upload["artifact"]])
+					for url in artifacts[upload["artifact"]]:
+						pages[url]["published"] = True
+					print("PUBLISHED " + upload["artifact"] + " (%d attempts, %.2fs)" % (upload["attempts"], upload["elapsed"]))
+				else:
+					print("FAILED to publish " + upload["artifact"] + ": " + upload["error"])
+	finally:
+		fetch.close()
+		state.saveState(pages, options.state)
+	if options.stats:
+		stats.export(options.stats)
+	if options.report:
+		with open(options.report, "w") as f:
+			json.dump(report, f, indent=1, sort_keys=True)
+	if options.changes:
+		with open(options.changes, "w") as f:
+			json.dump(changes, f, indent=1, sort_keys=True)
+
+	elapsed = time.time() - start
+	print()
+	print("Processed %d URLs in %.2fs (%.2f pages/s): %d succeeded, %d failed." % (len(urls), elapsed, len(urls) / elapsed if elapsed > 0 else 0, succeeded, failed))
+	print("%d skipped as unchanged, %d re-extracted with the same contract, %d generated, %d re-published." % (skipped, same, extracted, published))
+	for code, n in errors.most_common():
+		print("%6d error   %s" % (n, code))
+	for code, n in warnings.most_common():
+		print("%6d warning %s" % (n, code))
+	return failed == 0
+
+# Crawl sites from seed URLs and write the hRESTS pages found as a URL list for --batch
+def runCrawl(args):
+	parser = argparse.ArgumentParser(prog=sys.argv[0] + " --crawl", description="Discover hRESTS pages by following the links of sites.")
+	parser.add_argument("seeds", nargs="*", help="URLs to start from; links are followed to their hosts only (default: resume the saved crawl)")
+	parser.add_argument("--config", action="append", help="hRESTS configuration file, or directory of config*.ini files, picked per URL by their [SITE] hosts; can be repeated (default: " + CONFIG_FILE + ")")
+	parser.add_argument("--depth", type=int, default=crawl.MAX_DEPTH, help="links followed from a seed (default: %d)" % crawl.MAX_DEPTH)
+	parser.add_argument("--delay", type=float, default=crawl.HOST_DELAY, help="seconds between two requests to one host, or its robots.txt Crawl-delay if longer (default: %.1f)" % crawl.HOST_DELAY)
+	parser.add_argument("--per-host", type=int, default=1, help="concurrent requests to one host (default: 1)")
+	parser.add_argument("--workers", type=int, default=8, help="number of pages fetched concurrently across hosts (default: 8)")
+	parser.add_argument("--max-pages", type=int, help="stop after crawling this many pages, counting those of resumed crawls")
+	parser.add_argument("--state", default=crawl.CRAWL_FILE, help="file recording the frontier and the URLs seen, to resume an interrupted crawl (default: " + crawl.CRAWL_FILE + ")")
+	parser.add_argument("--restart", action="store_true", help="forget the saved crawl and start again from the seeds")
+	parser.add_argument("--ignore-robots", action="store_true", help="don't read robots.txt")
+	parser.add_argument("--output", default="-", help="file receiving the hRESTS URLs found, one per line, or - for stdout (default: -)")
+	parser.add_argument("--stats", help="write stage timings and counters to this file, in Prometheus text format if it ends with .prom and JSON otherwise")
+	options = parser.parse_args(args)
+	if options.stats:
+		stats.enable()
+	if options.depth < 0:
+		parser.error("--depth can't be negative")
+	if options.delay < 0:
+		parser.error("--delay can't be negative")
+	if options.per_host < 1:
+		parser.error("--per-host must be at least 1")
+	if options.workers < 1:
+		parser.error("--workers must be at least 1")
+
+	# The URL list may go to stdout, so progress goes to stderr
+	log = lambda line: print(line, file=sys.stderr)
+	configs = generateDictionaries(options.config or [CONFIG_FILE])
+	fetch.PER_HOST = options.per_host
+	crawler = crawl.Crawler(configs, fetch.default(), options.state, options.depth, options.delay, options.per_host, options.max_pages, not options.ignore_robots, log)
+	if not options.restart and crawler.load():
+		log("Resuming the crawl saved in %s: %d pages crawled, %d queued, %d hRESTS pages found." % (options.state, crawler.crawled, len(crawler.frontier), len(crawler.found)))
+	try:
+		crawler.seed(options.seeds)
+	except ValueError as e:
+		parser.error(str(e))
+	if not crawler.frontier and not crawler.found:
+		parser.error("give seed URLs to start a crawl")
+
+	start = time.time()
+	try:
+		found = crawler.run(options.workers)
+	except KeyboardInterrupt:
+		log("Interrupted; the crawl is saved in " + options.state + ", run again without --restart to resume it.")
+		fetch.close()
 		return False
+	fetch.close()
+	if options.stats:
+		stats.export(options.stats)
 
-# Main Program
-if len(sys.argv) < 2:
-  print('Usage: %s <hRESTS URL address>' % sys.argv[0])
-  print('Press Enter to exit.')
-  input()
-  sys.exit(1)
-else:
-	hrests_url = sys.argv[1]
+	lines = "".join(url + "\n" for url in sorted(found, key=lambda url: (found[url], url)))
+	if options.output == "-":
+		sys.stdout.write(lines)
+	else:
+		with open(options.output, "w") as f:
+			f.write(lines)
+	log("Crawled %d pages in %.2fs: %d hRESTS pages found, %d failed, %d left in the frontier." % (crawler.crawled, time.time() - start, len(found), crawler.failed, len(crawler.frontier)))
+	return True
+
+# Open a page for streaming extraction: a local file name as is, or the decoded body of an HTTP response, downloaded
+# to a temporary file by the shared fetcher with its per-host limits and retries
+def openStream(hrests_url):
+	if urlparse(hrests_url).scheme == "":
+		return hrests_url
+	response = fetch.default().getFile(hrests_url)
+	try:
+		response.raise_for_status()
+	except fetch.FetchError:
+		response.file.close()
+		raise
+	return response.file
+
+# Extract a single page, then ask whether to save it to WSO2 Governance Registry
+def runSingle(hrests_url, stream=False):
 	try:
-		html_text = requests.get(hrests_url).text
-	except:
+		if stream:
+			source = openStream(hrests_url)
+		else:
+			response = fetch.default().get(hrests_url)
+			response.raise_for_status()
+			html_text = response.text
+	except Exception as e:
+		print(e)
 		print("Could not retrieve source page, check your connection.")
 		sys.exit(1)
-	if isinstance (html_text, tuple):
-		print(html_text[0])
-		print('%s : %s' % (html_text[1], html_text[2]))
-		sys.exit()
+
+	hrests_dict = generateDictionary()
+	try:
+		if stream:
+			try:
+				resources = extractStream(source, hrests_dict)
+			finally:
+				if not isinstance(source, str):
+					source.close()
+		else:
+			resources = extract(html_text, hrests_dict)
+		generateWSDL2(resources, hrests_dict)
+	except ExtractionError as e:
+		for entry in e.diagnostics:
+			print(formatDiagnostic(entry))
+		print(e)
+		print("Check your HTML document.")
+		sys.exit(1)
+	except Exception as e:
+		print(e)
+		sys.exit(1)
+	for entry in resources.diagnostics:
+		print(formatDiagnostic(entry))
+	print()
+	if stream:
+		print(str(len(resources.operations)) + " operations extracted.")
 	else:
-		hrests_dict = generateDictionary()
-		resources = html2resourcesxpath(html_text, hrests_dict)
-		generateWSDL2(resources)
-		print()
-		print(resources)
-		print()
-
-		isSaveToRepository = input("Save to WSO2 Governance Registry? [y/n] ")
-		while isSaveToRepository != 'y' and isSaveToRepository != 'Y' and isSaveToRepository != 'n' and isSaveToRepository != 'N':
-			isSaveToRepository = input("Unknown input.\nSave to WSO2 Governance Registry? [y/n] ")
-
-		if isSaveToRepository == 'y' or isSaveToRepository == 'Y':
-			save.saveToRepository(resources, hrests_dict)
-		
\ No newline at end of file
+		print(resources.asDict())
+	print()
+
+	isSaveToRepository = input("Save to WSO2 Governance Registry? [y/n] ")
+	while isSaveToRepository != 'y' and isSaveToRepository != 'Y' and isSaveToRepository != 'n' and isSaveToRepository != 'N':
+		isSaveToRepository = input("Unknown input.\nSave to WSO2 Governance Registry? [y/n] ")
+
+	if isSaveToRepository == 'y' or isSaveToRepository == 'Y':
+		save.saveToRepository(resources, hrests_dict)
+
+# Command line interface
+def main():
+	xsdcache.CACHE_DIR = SCHEMA_CACHE_DIR
+	settings.CACHE_DIR = CONFIG_CACHE_DIR
+	if len(sys.argv) < 2:
+		print('Usage: %s <hRESTS URL address>' % sys.argv[0])
+		print('       %s --stream <hRESTS URL address | HTML file>' % sys.argv[0])
+		print('       %s --batch [--config PATH]... [--workers N] [--per-host N] [--formats LIST] [--processes N] [--publish [--publishers N]] [--force] [--report FILE] [--changes FILE] <URL list file | ->' % sys.argv[0])
+		print('       %s --crawl [--config PATH]... [--depth N] [--delay SECONDS] [--max-pages N] [--restart] [--output FILE] [<seed URL>...]' % sys.argv[0])
+		print('Press Enter to exit.')
+		input()
+		sys.exit(1)
+	# Every mode fetches through the shared fetcher, closed however the mode ends
+	try:
+		if sys.argv[1] == "--batch":
+			sys.exit(0 if runBatch(sys.argv[2:]) else 1)
+		elif sys.argv[1] == "--crawl":
+			sys.exit(0 if runCrawl(sys.argv[2:]) else 1)
+		elif sys.argv[1] == "--stream" and len(sys.argv) > 2:
+			runSingle(sys.argv[2], stream=True)
+		else:
+			runSingle(sys.argv[1])
+	finally:
+		fetch.close()
+
+# Main Program
+if __name__ == "__main__":
+	main()
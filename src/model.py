@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# model.py
+
+# Resources extracted from an hRESTS document: a Service of Operations, each with an input and output Message of Params.
+# The classes are slotted and the strings repeated across a catalogue (types, methods, param names, endpoints,
+# occurrences) are interned, so a batch can keep every extracted service in memory. asDict() returns the nested
+# dictionaries earlier versions returned, and dumps()/loads() serialize to compact JSON or msgpack.
+
+# Libraries
+from dataclasses import dataclass, field
+from typing import List, Optional
+import json, sys
+
+try:
+	import msgpack
+except ImportError:
+	msgpack = None
+
+# Bumped whenever the serialized form changes
+FORMAT_VERSION = 1
+
+def intern(value):
+	return sys.intern(value) if value is not None else None
+
+@dataclass(slots=True)
+class Param:
+	name: str
+	type: str = "string"
+	minOccurs: Optional[str] = None
+	maxOccurs: Optional[str] = None
+
+	def __post_init__(self):
+		self.name = sys.intern(self.name)
+		self.type = sys.intern(self.type)
+		self.minOccurs = intern(self.minOccurs)
+		self.maxOccurs = intern(self.maxOccurs)
+
+	def asDict(self):
+		param = {"name": self.name, "type": self.type}
+		if self.minOccurs is not None:
+			param["minOccurs"] = self.minOccurs
+		if self.maxOccurs is not None:
+			param["maxOccurs"] = self.maxOccurs
+		return param
+
+	def asList(self):
+		return [self.name, self.type, self.minOccurs, self.maxOccurs]
+
+@dataclass(slots=True)
+class Message:
+	name: str
+	params: List[Param] = field(default_factory=list)
+
+	def asDict(self):
+		return {"message": self.name, "params": [param.asDict() for param in self.params]}
+
+	def asList(self):
+		return [self.name, [param.asList() for param in self.params]]
+
+	@staticmethod
+	def fromList(values):
+		return Message(values[0], [Param(*param) for param in values[1]])
+
+@dataclass(slots=True)
+class Operation:
+	name: str
+	method: str
+	endpoint: str
+	binding: Optional[str] = None
+	input: Optional[Message] = None
+	output: Optional[Message] = None
+
+	def __post_init__(self):
+		self.method = sys.intern(self.method)
+		self.endpoint = sys.intern(self.endpoint)
+		self.binding = intern(self.binding)
+
+	def messages(self):
+		return (self.input, self.output)
+
+	def asDict(self):
+		op = {"name": self.name, "method": self.method, "endpoint": self.endpoint}
+		if self.binding is not None:
+			op["binding"] = self.binding
+		op["input"] = self.input.asDict()
+		op["output"] = self.output.asDict()
+		return op
+
+	def asList(self):
+		return [self.name, self.method, self.endpoint, self.binding, self.input.asList(), self.output.asList()]
+
+	@staticmethod
+	def fromList(values):
+		return Operation(values[0], values[1], values[2], values[3], Message.fromList(values[4]), Message.fromList(values[5]))
+
+@dataclass(slots=True)
+class Service:
+	operations: List[Operation] = field(default_factory=list)
+	diagnostics: list = field(default_factory=list)
+	schemaLocation: Optional[str] = None
+
+	def paramCount(self):
+		return sum(len(op.input.params) + len(op.output.params) for op in self.operations)
+
+	# Return the resources as the nested dictionaries of earlier versions
+	def asDict(self):
+		resources = {"operations": [op.asDict() for op in self.operations], "diagnostics": self.diagnostics}
+		if self.schemaLocation is not None:
+			resources["schemaLocation"] = self.schemaLocation
+		return resources
+
+	def asList(self):
+		return [FORMAT_VERSION, [op.asList() for op in self.operations], self.diagnostics, self.schemaLocation]
+
+	@staticmethod
+	def fromList(values):
+		if values[0] != FORMAT_VERSION:
+			raise ValueError("Unsupported resources format " + str(values[0]) + ".")
+		return Service([Operation.fromList(op) for op in values[1]], values[2], values[3])
+
+# Build a Service from the nested dictionaries of earlier versions
+def fromDict(resources):
+	operations = []
+	for op in resources["operations"]:
+		messages = [Message(op[direction]["message"], [Param(param["name"], param["type"], param.get("minOccurs"), param.get("maxOccurs")) for param in op[direction]["params"]]) for direction in ("input", "output")]
+		operations.append(Operation(op["name"], op["method"], op["endpoint"], op.get("binding"), messages[0], messages[1]))
+	return Service(operations, list(resources.get("diagnostics", [])), resources.get("schemaLocation"))
+
+# Serialize a Service as compact JSON or, when the msgpack package is installed, msgpack
+def dumps(service, format="json"):
+	if format == "msgpack":
+		if msgpack is None:
+			raise ValueError("msgpack serialization needs the msgpack package.")
+		return msgpack.packb(service.asList(), use_bin_type=True)
+	return json.dumps(service.asList(), separators=(",", ":")).encode("utf-8")
+
+def loads(content, format="json"):
+	if format == "msgpack":
+		if msgpack is None:
+			raise ValueError("msgpack serialization needs the msgpack package.")
+		return Service.fromList(msgpack.unpackb(content, raw=False))
+	return Service.fromList(json.loads(content.decode("utf-8")))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# renderers.py
+
+# Renderers turning the resources extracted from an hRESTS document into the documents of each output format.
+# A renderer takes a model.Service and its config and returns the document's bytes, and may also write it to a binary
+# file as it goes, so large documents are stored without being held in memory; renderAll() renders every
+# requested format from the same extraction. WSDL 2.0 is registered by hextract.py, imported the first time the
+# renderers are looked up without it, and OpenAPI 3.1 and JSON Schema here.
+
+# Libraries
+from urllib.parse import urlparse, parse_qsl
+import functools, importlib, json
+import stats
+
+# Renderers by format name
+RENDERERS = {}
+
+# Formats rendered unless others are asked for
+DEFAULT_FORMATS = ("wsdl",)
+
+# Modules registering the renderers of formats defined outside this one
+PROVIDERS = {"wsdl": "hextract"}
+
+# Methods an OpenAPI path item can hold
+OPENAPI_METHODS = frozenset(["get", "put", "post", "delete", "options", "head", "patch", "trace"])
+
+# Methods whose input is serialized in the query string rather than the body, as in the WSDL 2.0 HTTP binding
+QUERY_METHODS = frozenset(["GET", "DELETE", "HEAD", "OPTIONS"])
+
+# Messages are XML elements, serialized as application/xml by default in the WSDL 2.0 HTTP binding
+MEDIA_TYPE = "application/xml"
+
+# JSON Schema of the XSD built-in types; the others are strings
+XSD_SCHEMAS = {
+	"boolean": {"type": "boolean"},
+	"byte": {"type": "integer", "minimum": -128, "maximum": 127},
+	"short": {"type": "integer", "minimum": -32768, "maximum": 32767},
+	"int": {"type": "integer", "format": "int32"},
+	"long": {"type": "integer", "format": "int64"},
+	"integer": {"type": "integer"},
+	"unsignedByte": {"type": "integer", "minimum": 0, "maximum": 255},
+	"unsignedShort": {"type": "integer", "minimum": 0, "maximum": 65535},
+	"unsignedInt": {"type": "integer", "minimum": 0, "maximum": 4294967295},
+	"unsignedLong": {"type": "integer", "minimum": 0},
+	"nonNegativeInteger": {"type": "integer", "minimum": 0},
+	"positiveInteger": {"type": "integer", "minimum": 1},
+	"nonPositiveInteger": {"type": "integer", "maximum": 0},
+	"negativeInteger": {"type": "integer", "maximum": -1},
+	"decimal": {"type": "number"},
+	"precisionDecimal": {"type": "number"},
+	"float": {"type": "number", "format": "float"},
+	"double": {"type": "number", "format": "double"},
+	"date": {"type": "string", "format": "date"},
+	"dateTime": {"type": "string", "format": "date-time"},
+	"dateTimeStamp": {"type": "string", "format": "date-time"},
+	"time": {"type": "string", "format": "time"},
+	"duration": {"type": "string", "format": "duration"},
+	"dayTimeDuration": {"type": "string", "format": "duration"},
+	"yearMonthDuration": {"type": "string", "format": "duration"},
+	"anyUri": {"type": "string", "format": "uri"},
+	"base64Binary": {"type": "string", "contentEncoding": "base64"},
+	"hexBinary": {"type": "string", "pattern": "^([0-9a-fA-F]{2})*$"},
+}
+
+class Renderer:
+	__slots__ = ("name", "render", "extension", "mediaType", "write")
+
+	def __init__(self, name, render, extension, mediaType, write=None):
+		self.name = name
+		self.render = render
+		self.extension = extension
+		self.mediaType = mediaType
+		self.write = write
+
+# Register render(resources, config) as the renderer of a format, stored as <serviceName><extension>.
+# write(resources, config, file), when given, writes the same document to a binary file incrementally.
+def register(name, extension, mediaType, write=None):
+	def decorator(render):
+		RENDERERS[name] = Renderer(name, render, extension, mediaType, write)
+		return render
+	return decorator
+
+# Return every renderer by format name, importing the modules that register those not registered yet
+def available():
+	for name, module in PROVIDERS.items():
+		if name not in RENDERERS:
+			importlib.import_module(module)
+	return RENDERERS
+
+# Parse a comma-separated list of format names; unknown ones raise ValueError
+def parseFormats(text):
+	formats = []
+	for name in text.split(","):
+		name = name.strip().lower()
+		if not name:
+			continue
+		if name not in available():
+			raise ValueError("unknown format " + name + " (known: " + ", ".join(sorted(RENDERERS)) + ").")
+		if name not in formats:
+			formats.append(name)
+	if not formats:
+		raise ValueError("no format given.")
+	return formats
+
+# Return the file name each format of a service is stored under
+def fileName(name, config):
+	return config["serviceName"] + available()[name].extension
+
+# Render every format of resources, skipping those already rendered ({name: content}). With stream, the formats
+# that can be written incrementally are returned as functions writing them to a binary file, left for the store to call.
+def renderAll(resources, config, formats, rendered=None, stream=False):
+	rendered = dict(rendered or {})
+	with stats.timed("render"):
+		for name in formats:
+			if name not in rendered:
+				renderer = available()[name]
+				if stream and renderer.write is not None:
+					rendered[name] = functools.partial(renderer.write, resources, config)
+					continue
+				with stats.timed("render_" + name):
+					rendered[name] = renderer.render(resources, config)
+	return rendered
+
+def dumps(document):
+	return (json.dumps(document, indent=1, ensure_ascii=False) + "\n").encode("utf-8")
+
+# Return the JSON Schema of a param, an array of its type when it may occur more than once
+def paramSchema(param):
+	schema = dict(XSD_SCHEMAS.get(param.type, {"type": "string"}))
+	if param.maxOccurs is None or param.maxOccurs in ("0", "1"):
+		return schema
+	schema = {"type": "array", "items": schema}
+	if param.minOccurs is not None and param.minOccurs.isdigit() and int(param.minOccurs) > 1:
+		schema["minItems"] = int(param.minOccurs)
+	if param.maxOccurs.isdigit():
+		schema["maxItems"] = int(param.maxOccurs)
+	return schema
+
+# Return the key of a message among the schemas; prefixed names become prefix.name
+def schemaName(message):
+	return message.name.replace(":", ".")
+
+# Return the JSON Schema of a message: an object of its params, or a description of the element an imported XSD declares.
+# A prefix the config doesn't import can't be resolved, so its message is described by its params in the target namespace.
+def messageSchema(message, config):
+	prefix, name = message.name.split(":", 1) if ":" in message.name else (None, message.name)
+	if prefix in config["importedXsd"]:
+		namespace, schemaLocation = config["importedXsd"][prefix]
+		return {"type": "object", "description": "Element " + name + " of " + namespace + ", declared in " + schemaLocation + ".", "xml": {"name": name, "namespace": namespace}}
+	schema = {"type": "object", "properties": {}}
+	required = []
+	for param in message.params:
+		schema["properties"][param.name] = paramSchema(param)
+		# As in XSD, params occur once unless minOccurs says otherwise
+		if param.minOccurs is None or param.minOccurs != "0":
+			required.append(param.name)
+	if required:
+		schema["required"] = required
+	schema["xml"] = {"name": name, "namespace": config["targetNamespace"]}
+	return schema
+
+# Return the schema of every message of resources, in order of first use
+def messageSchemas(resources, config):
+	schemas = {}
+	for op in resources.operations:
+		for message in op.messages():
+			if schemaName(message) not in schemas:
+				schemas[schemaName(message)] = messageSchema(message, config)
+	return schemas
+
+# Return the query parameters of a message sent in the query string
+def queryParameters(schema):
+	parameters = []
+	for name, property in schema.get("properties", {}).items():
+		parameters.append({"name": name, "in": "query", "required": name in schema.get("required", []), "schema": property})
+	return parameters
+
+@register("openapi", ".openapi.json", "application/vnd.oai.openapi+json")
+def renderOpenAPI(resources, config):
+	schemas = messageSchemas(resources, config)
+	origins = []
+	for op in resources.operations:
+		location = urlparse(op.endpoint)
+		origin = location.scheme + "://" + location.netloc
+		if origin not in origins:
+			origins.append(origin)
+
+	paths = {}
+	for op in resources.operations:
+		location = urlparse(op.endpoint)
+		item = paths.setdefault(location.path or "/", {})
+		method = op.method.lower()
+
+		operation = {"operationId": op.name}
+		if len(origins) > 1:
+			operation["servers"] = [{"url": location.scheme + "://" + location.netloc}]
+		# The query string of the endpoint is sent as it is by every request
+		parameters = [{"name": name, "in": "query", "required": True, "schema": {"const": value}} for name, value in parse_qsl(location.query, keep_blank_values=True)]
+		inputSchema = schemas[schemaName(op.input)]
+		if op.method in QUERY_METHODS and "properties" in inputSchema:
+			parameters.extend(queryParameters(inputSchema))
+		else:
+			operation["requestBody"] = {"required": True, "content": {MEDIA_TYPE: {"schema": {"$ref": "#/components/schemas/" + schemaName(op.input)}}}}
+		if parameters:
+			operation["parameters"] = parameters
+		operation["responses"] = {"200": {"description": op.output.name, "content": {MEDIA_TYPE: {"schema": {"$ref": "#/components/schemas/" + schemaName(op.output)}}}}}
+		if method not in OPENAPI_METHODS:
+			# Other methods can only be described by an extension
+			operation["x-method"] = op.method
+			method = "x-" + method
+		if method in item:
+			# A path item holds one operation per method, while hRESTS pages may tell operations on the same path
+			# apart by their params, query string or server only, so the others are listed by an extension
+			operation["x-method"] = op.method
+			item.setdefault("x-operations", []).append(operation)
+		else:
+			item[method] = operation
+
+	document = {"openapi": "3.1.0", "info": {"title": config["serviceName"], "version": "1.0", "x-targetNamespace": config["targetNamespace"]}}
+	if len(origins) == 1:
+		document["servers"] = [{"url": origins[0]}]
+	document["paths"] = paths
+	document["components"] = {"schemas": schemas}
+	return dumps(document)
+
+@register("jsonschema", ".schema.json", "application/schema+json")
+def renderJsonSchema(resources, config):
+	return dumps({
+		"$schema": "https://json-schema.org/draft/2020-12/schema",
+		"title": config["serviceName"],
+		"$comment": "Messages of the " + config["serviceName"] + " service of " + config["targetNamespace"] + ".",
+		# The xml keyword is OpenAPI's, JSON Schema validators would only ignore it
+		"$defs": dict((name, dict((k, v) for k, v in schema.items() if k != "xml")) for name, schema in messageSchemas(resources, config).items()),
+	})
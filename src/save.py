@@ -1,39 +1,41 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-# hextract.py
+# save.py
 
 # Libraries
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+import requests, os, threading, time
+import stats, settings, store
 
-# Generate save dictionary using save.ini
-def generateSave(filename):
-	save_dict = {}
+# Seconds to wait for the registry to answer an upload
+UPLOAD_TIMEOUT = 60
+
+# Upload attempts per artifact, and the delay before the first retry (doubled on each retry)
+UPLOAD_RETRIES = 3
+RETRY_BACKOFF = 1.0
+
+# Registry settings
+SAVE_FILE = "../config/save.ini"
+
+# save.ini, parsed once per run
+saveTemplate = None
+saveTemplateLock = threading.Lock()
+
+# Parse save.ini, keeping {filename} placeholders for generateSave to fill in.
+# [HEADERS] and [DATA] become the "headers" and "data" dictionaries, the keys of other sections are kept at the top level.
+# A missing file is created with default settings; it and an invalid file raise settings.ConfigError.
+def readSave(path=SAVE_FILE):
+	save_dict = {"headers": {}, "data": {}}
 
 	try:
-		f = open("../config/save.ini", "r")
-		current_dict = save_dict
-		for line in f:
-			if len(line) > 1 and line[0] != '[':
-				k, v = line.split('=', 1)
-				if v.rstrip() == "{filename}":
-					current_dict[k] = filename
-				else:
-					current_dict[k] = v.rstrip()
-			elif "HEADERS" in line:
-				save_dict["headers"] = {}
-				current_dict = save_dict["headers"]
-			elif "DATA" in line:
-				save_dict["data"] = {}
-				current_dict = save_dict["data"]
-			else:
-				current_dict = save_dict
-			
-		f.close()
+		with open(path, "r") as f:
+			parser = settings.readIni(f.read())
+	except settings.ConfigError as e:
+		raise settings.ConfigError("Error in " + path + ": " + str(e))
 	except IOError:
-		print("No configuration file found. Generating default configuration file at ../config/save.ini.")
-		print("Please set your save parameters and try again.")
-		f = open("../config/save.ini", 'w')
+		f = open(path, 'w')
 		f.write("[API]\n")
 		f.write("endpoint=\n")
 		f.write("\n")
@@ -42,27 +44,117 @@ def generateSave(filename):
 		f.write("[DATA]\n")
 		f.write("\n")
 		f.close()
+		raise settings.ConfigError("No configuration file found. Generated default configuration file at " + path + ", please set your save parameters and try again.")
+
+	for section in parser.sections():
+		if section == "HEADERS":
+			save_dict["headers"].update(parser[section])
+		elif section == "DATA":
+			save_dict["data"].update(parser[section])
+		else:
+			save_dict.update(parser[section])
+	if not save_dict.get("endpoint"):
+		raise settings.ConfigError("Error in " + path + ": missing endpoint in [API].")
+	return save_dict
 
-		sys.exit(1)
+# Read save.ini once per run; call it before extracting, so a bad file fails the run before any work is done
+def loadSave(path=SAVE_FILE):
+	global saveTemplate
+	with saveTemplateLock:
+		if saveTemplate is None:
+			saveTemplate = readSave(path)
+		return saveTemplate
 
+# Generate save dictionary using save.ini
+def generateSave(filename):
+	save_dict = {}
+	for k, v in loadSave().items():
+		if isinstance(v, dict):
+			save_dict[k] = dict((hk, filename if hv == "{filename}" else hv) for hk, hv in v.items())
+		else:
+			save_dict[k] = filename if v == "{filename}" else v
 	return save_dict
 
-# Save the generated WSDL 2.0 to WSO2 Governance Registry
-def saveToRepository(resources, hrests_dict):
-	filename = hrests_dict["serviceName"] + ".wsdl"
+# Create a keep-alive session for uploads to the registry
+def createSession(workers):
+	session = requests.Session()
+	adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+	session.mount("http://", adapter)
+	session.mount("https://", adapter)
+	return session
+
+# Describe a failed upload from the registry's JSON error body, or its status line
+def describeError(response):
+	try:
+		error = response.json()
+		return str(error['code']) + " " + error['description'] + ": " + error['message']
+	except (ValueError, KeyError, TypeError):
+		return str(response.status_code) + " " + response.reason
+
+# Upload one WSDL/zip artifact, retrying with exponential backoff on 5xx responses and connection errors
+def publishArtifact(session, path, filename, retries=UPLOAD_RETRIES, backoff=RETRY_BACKOFF):
 	save_dict = generateSave(filename)
-	url = save_dict["endpoint"]
+	# Stored artifacts are named after their hash; upload them under the service's name
+	uploadName = os.path.splitext(filename)[0] + os.path.splitext(path)[1]
+	verify = save_dict.get("verify", "False").lower() == "true"
+	result = {"artifact": path, "filename": filename, "ok": False, "status": None, "attempts": 0, "error": None}
+	start = time.time()
+	for attempt in range(retries):
+		if attempt > 0:
+			time.sleep(backoff * 2 ** (attempt - 1))
+		result["attempts"] = attempt + 1
+		stats.count("upload_attempts")
+		try:
+			with open(path, 'rb') as f, stats.timed("publish"):
+				response = session.post(save_dict["endpoint"], data=save_dict["data"], verify=verify, headers=save_dict["headers"], files={'wsdl_file': (uploadName, f)}, timeout=UPLOAD_TIMEOUT)
+		except requests.RequestException as e:
+			result["status"] = None
+			result["error"] = str(e)
+			continue
+		except IOError as e:
+			result["error"] = str(e)
+			break
+		result["status"] = response.status_code
+		if response.status_code == 200:
+			result["ok"] = True
+			result["error"] = None
+			break
+		result["error"] = describeError(response)
+		if response.status_code < 500:
+			break
+	result["elapsed"] = time.time() - start
+	stats.count("uploads" if result["ok"] else "upload_failures")
+	return result
 
-	if "schemaLocation" not in resources: 
-		files = {'wsdl_file': open("../wsdl/" + hrests_dict["serviceName"] + ".wsdl", 'rb')}
-	else:
-		files = {'wsdl_file': open("../wsdl/" + hrests_dict["serviceName"] + "/" + hrests_dict["serviceName"] + ".zip", 'rb')}
-	r2 = requests.post(url, data=save_dict["data"], verify=False, headers=save_dict["headers"], files=files)
-	print(r2)
-	if (r2.status_code != 200):
-		print(str(r2.json()['code']) + " " + r2.json()['description'] + ": " + r2.json()['message'])
-	else:
+# Upload many artifacts concurrently over one session; artifacts is a list of (path, filename)
+def publishArtifacts(artifacts, workers=4, retries=UPLOAD_RETRIES, backoff=RETRY_BACKOFF):
+	# Read here rather than in the upload threads, so an invalid save.ini raises in the caller
+	loadSave()
+	session = createSession(workers)
+	try:
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			futures = [executor.submit(publishArtifact, session, path, filename, retries, backoff) for path, filename in artifacts]
+			return [future.result() for future in futures]
+	finally:
+		session.close()
+
+# Return the artifact generateWSDL2 last stored for a service and the name it is uploaded under
+def artifactOf(resources, hrests_dict, outputDir="../wsdl"):
+	return store.currentArtifact(outputDir, hrests_dict["serviceName"], hrests_dict["targetNamespace"]), hrests_dict["serviceName"] + ".wsdl"
+
+# Save the generated WSDL 2.0 to WSO2 Governance Registry
+def saveToRepository(resources, hrests_dict, outputDir="../wsdl"):
+	path, filename = artifactOf(resources, hrests_dict, outputDir)
+	try:
+		result = publishArtifacts([(path, filename)], workers=1)[0]
+	except settings.ConfigError as e:
+		print(e)
+		return None
+	if result["ok"]:
 		print("File succesfully uploaded.")
+	else:
+		print(result["error"])
+	return result
 
 # Save the generated WSDL 2.0 to WSO2 Governance Registry
 def saveToRepository2(resources, hrests_dict, save_dict):
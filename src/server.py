@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# server.py
+
+# Libraries
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from collections import deque
+import argparse, json, math, threading, time
+import hextract, xsdcache, stats, fetch, settings, renderers
+
+# Largest HTML body accepted by /extract
+MAX_BODY = 50 * 1024 * 1024
+
+# Latest latencies kept per stage for the percentiles of /stats
+LATENCY_WINDOW = 10000
+
+# Stages timed by the server
+STAGES = ["fetch", "extract", "render", "total"]
+
+# Raised for requests that can't be served as sent, answered with a 400
+class BadRequest(ValueError):
+	pass
+
+# Return the length of a request body from its Content-Length header
+def contentLength(headers):
+	value = headers.get("Content-Length", "0")
+	try:
+		length = int(value)
+	except ValueError:
+		raise BadRequest("Invalid Content-Length " + value + ".")
+	if length < 0:
+		raise BadRequest("Invalid Content-Length " + value + ".")
+	return length
+
+# Record the latency of a request stage
+def recordLatency(latencies, lock, stage, seconds):
+	with lock:
+		latencies[stage].append(seconds)
+
+# Return the nearest-rank percentile of sorted values
+def percentile(values, p):
+	return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+# Summarize the recorded latencies of every stage in milliseconds
+def latencyPercentiles(latencies, lock):
+	with lock:
+		snapshot = dict((stage, sorted(latencies[stage])) for stage in STAGES)
+	summary = {}
+	for stage in STAGES:
+		values = snapshot[stage]
+		if not values:
+			summary[stage] = {"count": 0}
+			continue
+		summary[stage] = {"count": len(values)}
+		for p in (50, 90, 95, 99):
+			summary[stage]["p" + str(p)] = round(percentile(values, p) * 1000, 3)
+		summary[stage]["max"] = round(values[-1] * 1000, 3)
+	return summary
+
+# Handle extraction requests; the server carries the configs, fetcher and latencies shared by all requests
+class ExtractionHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+
+	def do_GET(self):
+		path = urlparse(self.path).path
+		if path == "/stats":
+			self.sendJson(200, latencyPercentiles(self.server.latencies, self.server.latenciesLock))
+		elif path == "/metrics":
+			self.send(200, "text/plain; version=0.0.4", stats.exportPrometheus().encode("utf-8"))
+		elif path == "/health":
+			self.sendJson(200, {"status": "ok"})
+		else:
+			self.sendJson(404, {"error": "Unknown path " + path + "."})
+
+	# Any error of a request is answered as JSON: a 400 when the request is at fault, a 500 otherwise
+	def do_POST(self):
+		try:
+			self.extract()
+		except BadRequest as e:
+			stats.count("bad_requests")
+			self.sendJson(400, {"error": str(e)})
+			self.close_connection = True
+		except Exception as e:
+			stats.count("request_errors")
+			self.log_error("Error while serving %s: %r", self.path, e)
+			self.sendJson(500, {"error": "Internal error: " + (str(e) or type(e).__name__)})
+			self.close_connection = True
+
+	def extract(self):
+		url = urlparse(self.path)
+		if url.path != "/extract":
+			# The body isn't read, so the connection is closed rather than parsed as the next request
+			self.sendJson(404, {"error": "Unknown path " + url.path + "."})
+			self.close_connection = True
+			return
+		query = parse_qs(url.query)
+		length = contentLength(self.headers)
+		if length > MAX_BODY:
+			self.sendJson(413, {"error": "Request body is larger than %d bytes." % MAX_BODY})
+			self.close_connection = True
+			return
+		body = self.rfile.read(length)
+		format = query.get("format", ["json"])[0]
+		if format != "json" and format not in renderers.available():
+			self.sendJson(400, {"error": "Unknown format " + format + ", use json or one of " + ", ".join(sorted(renderers.RENDERERS)) + "."})
+			return
+
+		start = time.perf_counter()
+		try:
+			# Pages are extracted with the config matching their host, HTML bodies with the default one
+			config = settings.select(self.server.configs, query["url"][0] if "url" in query else "")
+		except settings.ConfigError as e:
+			self.sendJson(400, {"error": str(e)})
+			return
+		if "url" in query:
+			try:
+				response = self.server.fetcher.get(query["url"][0])
+				response.raise_for_status()
+			except Exception as e:
+				self.sendJson(502, {"error": "Could not retrieve source page: " + str(e)})
+				return
+			document = response.text
+			self.record("fetch", time.perf_counter() - start)
+		elif len(body) > 0:
+			document = body
+		else:
+			self.sendJson(400, {"error": "Send an hRESTS document as the body or its address as ?url=."})
+			return
+
+		stage = time.perf_counter()
+		try:
+			resources = hextract.extract(document, config)
+		except hextract.ExtractionError as e:
+			self.sendJson(422, {"error": e.asDict(), "diagnostics": e.diagnostics})
+			return
+		self.record("extract", time.perf_counter() - stage)
+
+		# Only the requested format is rendered; the JSON answer carries the WSDL 2.0 document
+		stage = time.perf_counter()
+		renderer = renderers.available()["wsdl" if format == "json" else format]
+		document = renderer.render(resources, config)
+		self.record("render", time.perf_counter() - stage)
+		self.record("total", time.perf_counter() - start)
+
+		if format == "json":
+			self.sendJson(200, {"resources": resources.asDict(), "wsdl": document.decode("utf-8")})
+		else:
+			self.send(200, renderer.mediaType, document)
+
+	def record(self, stage, seconds):
+		recordLatency(self.server.latencies, self.server.latenciesLock, stage, seconds)
+
+	def sendJson(self, status, content):
+		self.send(status, "application/json", json.dumps(content).encode("utf-8"))
+
+	def send(self, status, contentType, content):
+		self.send_response(status)
+		self.send_header("Content-Type", contentType)
+		self.send_header("Content-Length", str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+# Create the extraction server with everything requests share loaded once
+def createServer(host, port, configs):
+	server = ThreadingHTTPServer((host, port), ExtractionHandler)
+	server.daemon_threads = True
+	server.configs = configs
+	hextract.loadSchemas(configs)
+	server.fetcher = fetch.default()
+	server.latencies = dict((stage, deque(maxlen=LATENCY_WINDOW)) for stage in STAGES)
+	server.latenciesLock = threading.Lock()
+	return server
+
+# Main Program
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serve hRESTS extraction over HTTP.")
+	parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+	parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+	parser.add_argument("--config", action="append", help="hRESTS configuration file, or directory of config*.ini files, picked per URL by their [SITE] hosts; can be repeated (default: " + hextract.CONFIG_FILE + ")")
+	options = parser.parse_args()
+
+	xsdcache.CACHE_DIR = hextract.SCHEMA_CACHE_DIR
+	settings.CACHE_DIR = hextract.CONFIG_CACHE_DIR
+	stats.enable()
+	server = createServer(options.host, options.port, hextract.generateDictionaries(options.config or [hextract.CONFIG_FILE]))
+	print("Serving hRESTS extraction on http://%s:%d/extract" % server.server_address[:2])
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	server.server_close()
+	fetch.close()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# settings.py
+
+# Loads hRESTS configuration files into frozen, validated configs with compiled XPath queries.
+# Parsed configs are kept in memory and, when CACHE_DIR is set, pickled to disk keyed by the file's mtime and hash.
+
+# Libraries
+from configparser import ConfigParser, Error as ParserError
+from fnmatch import fnmatch
+from urllib.parse import urlparse
+from lxml import etree
+import glob, hashlib, os, pickle, threading
+import stats
+
+# Directory holding the parsed configs of previous runs; None keeps them in memory only
+CACHE_DIR = None
+
+# Bumped whenever the parsed values change shape, so older pickles are ignored
+CACHE_VERSION = 2
+
+# Config files picked up from a directory
+CONFIG_PATTERN = "config*.ini"
+
+# Keys of the [XPATH QUERIES] section
+XPATH_QUERIES = ["service", "operation", "method", "endpoint", "input", "output", "param"]
+
+# Keys of the [CUSTOM ATTRIBUTES] section
+ATTRIBUTES = ["operationName", "binding", "type", "minOccurs", "maxOccurs", "message"]
+
+# Keys of each section, mapped to whether they are required; [IMPORTED XSD] takes any prefix
+SECTIONS = {
+	"XPATH QUERIES": dict((key, True) for key in XPATH_QUERIES),
+	"WSDL 2.0 ATTRIBUTES": {"serviceName": True, "targetNamespace": True, "xsdNamespace": False, "schemaLocation": False},
+	"IMPORTED XSD": None,
+	"CUSTOM ATTRIBUTES": dict((key, True) for key in ATTRIBUTES),
+	"SITE": {"hosts": False},
+	"VALIDATION": {"checkParams": False},
+}
+REQUIRED_SECTIONS = ["XPATH QUERIES", "WSDL 2.0 ATTRIBUTES", "CUSTOM ATTRIBUTES"]
+
+# Configs loaded by this process, keyed by absolute path, with the (mtime, size) they were loaded at
+configs = {}
+configsLock = threading.Lock()
+
+class ConfigError(Exception):
+	pass
+
+# Read-only dictionary; copy it with dict() to change values
+class FrozenDict(dict):
+	def readonly(self, *args, **kwargs):
+		raise TypeError("Configs are read-only, copy them with dict() to change values.")
+
+	__setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = readonly
+
+	def __reduce__(self):
+		return (type(self), (dict(self),))
+
+# Frozen hRESTS config with its compiled queries in config["queries"].
+# Pickles without the queries, which are compiled again when it is unpickled.
+class Config(FrozenDict):
+	def __init__(self, values, path=None):
+		values = dict(values)
+		values["queries"] = compileQueries(values)
+		dict.__init__(self, values)
+		self.path = path
+
+	def __reduce__(self):
+		return (Config, (dict((k, v) for k, v in self.items() if k != "queries"), self.path))
+
+# Compile the [XPATH QUERIES] once so every operation and document of a run reuses them
+def compileQueries(values):
+	queries = {}
+	for key in XPATH_QUERIES:
+		if key not in values:
+			raise ConfigError("missing xpath query \"" + key + "\".")
+		# The service query selects from the document root, the others are relative to their parent element
+		expression = values[key] if key == "service" else "." + values[key]
+		try:
+			queries[key] = etree.XPath(expression)
+		except etree.XPathSyntaxError as e:
+			raise ConfigError("invalid xpath query " + key + "=" + values[key] + " (" + str(e) + ").")
+	return FrozenDict(queries)
+
+# Parse an ini file, keeping the case of keys and values; malformed lines and duplicate keys raise ConfigError
+def readIni(text):
+	parser = ConfigParser(delimiters=("=",), comment_prefixes=("#", ";"), interpolation=None, strict=True, empty_lines_in_values=False)
+	parser.optionxform = str
+	try:
+		parser.read_string(text)
+	except ParserError as e:
+		raise ConfigError(str(e).replace("\n", " "))
+	return parser
+
+# Parse and check an hRESTS config file's text into plain values
+def parse(text):
+	parser = readIni(text)
+	for section in parser.sections():
+		if section not in SECTIONS:
+			raise ConfigError("unknown section [" + section + "].")
+	for section in REQUIRED_SECTIONS:
+		if not parser.has_section(section):
+			raise ConfigError("missing section [" + section + "].")
+
+	values = {}
+	for section, keys in SECTIONS.items():
+		if keys is None or not parser.has_section(section):
+			continue
+		for key in parser[section]:
+			if key not in keys:
+				raise ConfigError("unknown key " + key + " in [" + section + "].")
+		for key, required in keys.items():
+			if key in parser[section]:
+				values[key] = parser[section][key]
+			elif required:
+				raise ConfigError("missing key " + key + " in [" + section + "].")
+	# HTML parsers lowercase attribute names, so the custom attributes are matched in lowercase
+	for key in ATTRIBUTES:
+		values[key] = values[key].lower()
+
+	importedXsd = {}
+	if parser.has_section("IMPORTED XSD"):
+		for prefix, value in parser["IMPORTED XSD"].items():
+			importedXsd[prefix] = tuple(part.strip() for part in value.split(","))
+			if len(importedXsd[prefix]) != 2 or not all(importedXsd[prefix]):
+				raise ConfigError("imported XSD " + prefix + " must be namespace,schemaLocation.")
+	values["importedXsd"] = FrozenDict(importedXsd)
+	checkParams = values.pop("checkParams", "false").lower()
+	if checkParams not in ConfigParser.BOOLEAN_STATES:
+		raise ConfigError("checkParams must be true or false, not " + checkParams + ".")
+	values["checkParams"] = ConfigParser.BOOLEAN_STATES[checkParams]
+	values["hosts"] = tuple(host.strip().lower() for host in values.pop("hosts", "").split(",") if host.strip())
+	return values
+
+# Return the on-disk cache path of a config file
+def cachePath(key):
+	return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle")
+
+# Read the cached parse of a config file, or None
+def readCache(key):
+	if CACHE_DIR is None:
+		return None
+	try:
+		with open(cachePath(key), "rb") as f:
+			entry = pickle.load(f)
+	except (IOError, EOFError, pickle.UnpicklingError):
+		return None
+	if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION or entry.get("path") != key:
+		return None
+	return entry
+
+# Cache the parse of a config file, replacing the previous one atomically
+def writeCache(key, entry):
+	if CACHE_DIR is None:
+		return
+	path = cachePath(key)
+	try:
+		if not os.path.exists(CACHE_DIR):
+			os.makedirs(CACHE_DIR)
+		with open(path + ".tmp", "wb") as f:
+			pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+		os.replace(path + ".tmp", path)
+	except IOError as e:
+		print("Warning: couldn't cache config \"" + key + "\": " + str(e))
+
+# Parse a config file unless the disk cache holds it for the same mtime or content
+def loadFile(key, status):
+	entry = readCache(key)
+	if entry is not None and entry["mtime"] == status.st_mtime_ns and entry["size"] == status.st_size:
+		stats.count("config_cache_hits")
+		return entry["values"]
+	with open(key, "rb") as f:
+		content = f.read()
+	digest = hashlib.sha256(content).hexdigest()
+	if entry is not None and entry["hash"] == digest:
+		stats.count("config_cache_hits")
+		values = entry["values"]
+	else:
+		stats.count("config_cache_misses")
+		values = parse(content.decode("utf-8"))
+	writeCache(key, {"version": CACHE_VERSION, "path": key, "mtime": status.st_mtime_ns, "size": status.st_size, "hash": digest, "values": values})
+	return values
+
+# Load an hRESTS config file into a frozen Config, reusing the one already loaded while the file is unchanged.
+# A missing file raises IOError, an invalid one ConfigError.
+def load(path):
+	key = os.path.abspath(path)
+	status = os.stat(key)
+	with configsLock:
+		loaded = configs.get(key)
+	if loaded is not None and loaded[0] == (status.st_mtime_ns, status.st_size):
+		return loaded[1]
+	with stats.timed("config_load"):
+		config = Config(loadFile(key, status), path)
+	with configsLock:
+		configs[key] = ((status.st_mtime_ns, status.st_size), config)
+	return config
+
+# Load every config of paths, a directory standing for its config*.ini files
+def loadAll(paths):
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			files.extend(sorted(glob.glob(os.path.join(path, CONFIG_PATTERN))))
+		else:
+			files.append(path)
+	loaded = []
+	for path in files:
+		try:
+			loaded.append(load(path))
+		except ConfigError as e:
+			raise ConfigError(path + ": " + str(e))
+	return loaded
+
+# Return the config whose [SITE] hosts patterns match the host of url, or else the first config without hosts
+def select(configs, url):
+	location = urlparse(url)
+	host = (location.hostname or "").lower()
+	netloc = location.netloc.lower()
+	fallback = None
+	for config in configs:
+		if not config["hosts"]:
+			if fallback is None:
+				fallback = config
+		elif any(fnmatch(host, pattern) or fnmatch(netloc, pattern) for pattern in config["hosts"]):
+			return config
+	if fallback is None:
+		raise ConfigError("no configuration matches the host of " + url + ".")
+	return fallback
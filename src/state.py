@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# state.py
+
+# Libraries
+import os, json, hashlib
+
+# State of previous extraction runs
+STATE_FILE = "../state/state.json"
+
+# Load the per-URL state of previous runs
+def loadState(path=STATE_FILE):
+	try:
+		with open(path, "r") as f:
+			return json.load(f)
+	except IOError:
+		return {}
+	except ValueError:
+		print("Warning: state file " + path + " is corrupt, re-extracting every page.")
+		return {}
+
+# Save the per-URL state, replacing the previous file atomically
+def saveState(state, path=STATE_FILE):
+	directory = os.path.dirname(path)
+	if directory and not os.path.exists(directory):
+		os.makedirs(directory)
+	with open(path + ".tmp", "w") as f:
+		json.dump(state, f, indent=1, sort_keys=True)
+	os.replace(path + ".tmp", path)
+
+# Hash fetched page content
+def contentHash(content):
+	return hashlib.sha256(content).hexdigest()
+
+# Hash a file, or return None when it doesn't exist
+def fileHash(path):
+	try:
+		with open(path, "rb") as f:
+			return hashlib.sha256(f.read()).hexdigest()
+	except IOError:
+		return None
+
+# Hash the configuration values that affect the generated documents
+def configHash(hrests_dict):
+	config = {}
+	for k in hrests_dict:
+		# Compiled queries are derived from the other values
+		if k != "queries":
+			config[k] = hrests_dict[k]
+	return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Check whether an output still holds the content of digest; outputs of the artifact store are named after their hash
+def outputMatches(path, digest):
+	if os.path.splitext(os.path.basename(path))[0] == digest:
+		return os.path.exists(path)
+	return fileHash(path) == digest
+
+# Check whether the output recorded for a URL can be reused as is
+def isReusable(entry, configDigest):
+	return entry is not None and entry.get("configHash") == configDigest and entry.get("output") is not None and outputMatches(entry["output"], entry.get("outputHash"))
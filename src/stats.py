@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# stats.py
+
+# Libraries
+from contextlib import contextmanager, nullcontext
+import cProfile, json, os, re, threading, time
+
+# Nothing is recorded until enable() is called
+enabled = False
+
+# Directory receiving a cProfile dump per document, or None
+profileDir = None
+
+# Stage timings as [count, total seconds, max seconds], and counters
+timings = {}
+counters = {}
+lock = threading.Lock()
+
+# cProfile can only run one profiler at a time, so a process profiles one document at a time; batches profile either
+# with a single fetching thread or in their worker processes
+profileLock = threading.Lock()
+
+# Shared context returned by timed() and profiled() while disabled
+disabledContext = nullcontext()
+
+# Start recording, optionally dumping a cProfile per document to directory
+def enable(directory=None):
+	global enabled, profileDir
+	enabled = True
+	profileDir = directory
+	if profileDir is not None and not os.path.exists(profileDir):
+		os.makedirs(profileDir)
+
+# Forget everything recorded so far
+def reset():
+	with lock:
+		timings.clear()
+		counters.clear()
+
+# Add seconds to a stage
+def record(stage, seconds):
+	with lock:
+		timing = timings.get(stage)
+		if timing is None:
+			timings[stage] = [1, seconds, seconds]
+		else:
+			timing[0] += 1
+			timing[1] += seconds
+			if seconds > timing[2]:
+				timing[2] = seconds
+
+@contextmanager
+def timer(stage):
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		record(stage, time.perf_counter() - start)
+
+# Time the enclosed block as a stage
+def timed(stage):
+	if not enabled:
+		return disabledContext
+	return timer(stage)
+
+# Add value to a counter
+def count(name, value=1):
+	if not enabled:
+		return
+	with lock:
+		counters[name] = counters.get(name, 0) + value
+
+@contextmanager
+def profiler(name):
+	with profileLock:
+		profile = cProfile.Profile()
+		profile.enable()
+		try:
+			yield
+		finally:
+			profile.disable()
+			profile.dump_stats(os.path.join(profileDir, re.sub(r"[^A-Za-z0-9._-]+", "_", name)[:200] + ".prof"))
+
+# Profile the enclosed processing of a document when profiling is on
+def profiled(name):
+	if not enabled or profileDir is None:
+		return disabledContext
+	return profiler(name)
+
+# Return everything recorded as a JSON-serializable dictionary
+def snapshot():
+	with lock:
+		stages = {}
+		for stage, (calls, total, longest) in timings.items():
+			stages[stage] = {"count": calls, "seconds": total, "max": longest, "mean": total / calls}
+		return {"stages": stages, "counters": dict(counters)}
+
+# Export the recorded stats as JSON
+def exportJson():
+	return json.dumps(snapshot(), indent=1, sort_keys=True)
+
+# Export the recorded stats in the Prometheus text format
+def exportPrometheus():
+	stats = snapshot()
+	lines = ["# TYPE hextract_stage_seconds summary"]
+	for stage in sorted(stats["stages"]):
+		lines.append('hextract_stage_seconds_sum{stage="%s"} %f' % (stage, stats["stages"][stage]["seconds"]))
+		lines.append('hextract_stage_seconds_count{stage="%s"} %d' % (stage, stats["stages"][stage]["count"]))
+	lines.append("# TYPE hextract_stage_max_seconds gauge")
+	for stage in sorted(stats["stages"]):
+		lines.append('hextract_stage_max_seconds{stage="%s"} %f' % (stage, stats["stages"][stage]["max"]))
+	for name in sorted(stats["counters"]):
+		lines.append("# TYPE hextract_%s_total counter" % name)
+		lines.append("hextract_%s_total %d" % (name, stats["counters"][name]))
+	return "\n".join(lines) + "\n"
+
+# Write the recorded stats to path, as Prometheus text for .prom files and JSON otherwise
+def export(path):
+	with open(path, "w") as f:
+		f.write(exportPrometheus() if path.endswith(".prom") else exportJson())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# store.py
+
+# Content-addressed store of the generated documents. Every unique file is written once under blobs/, named after
+# its SHA-256 and extension, and every version of a service is a manifest under manifests/<service>/ listing the blobs
+# of every rendered format and the artifact published to the registry. Large documents are written to a temporary
+# file in the store while they are hashed, then renamed to their blob, so they are never held in memory.
+# Regenerating an unchanged service hashes its files and keeps nothing new.
+
+# Libraries
+from io import BytesIO
+import hashlib, json, os, shutil, threading, zipfile
+import stats
+
+# Date of every zip entry, so that identical files always make identical bundles
+ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+# Blobs this process wrote or found, the artifact of each manifest, and the current version of each service directory
+known = set()
+manifests = {}
+versions = {}
+knownLock = threading.Lock()
+
+# Hash content the way blobs are named
+def digest(content):
+	return hashlib.sha256(content).hexdigest()
+
+# Return the path of a blob from its name, the digest of its content followed by its extension
+def blobPath(directory, name):
+	return os.path.join(directory, "blobs", name[:2], name)
+
+# Return the digest of the content a blob path holds
+def digestOf(path):
+	return os.path.splitext(os.path.basename(path))[0]
+
+# Return the manifest directory of a service; services sharing a name are told apart by their target namespace
+def serviceDir(directory, service, targetNamespace):
+	return os.path.join(directory, "manifests", service + "-" + digest(targetNamespace.encode("utf-8"))[:12])
+
+# Write content through a temporary file, so that concurrent writers and readers never see a partial file
+def writeAtomic(path, content):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	temporary = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+	with open(temporary, "wb") as f:
+		f.write(content)
+	os.replace(temporary, path)
+	stats.count("bytes_written", len(content))
+
+# Check whether a blob exists, remembering those that do
+def exists(path):
+	with knownLock:
+		if path in known:
+			return True
+	if not os.path.exists(path):
+		return False
+	with knownLock:
+		known.add(path)
+	return True
+
+# Store content unless an identical blob exists, and return the blob's path
+def putBlob(directory, content, extension):
+	path = blobPath(directory, digest(content) + extension)
+	if exists(path):
+		stats.count("blobs_reused")
+		return path
+	writeAtomic(path, content)
+	stats.count("blobs_written")
+	with knownLock:
+		known.add(path)
+	return path
+
+# Binary file hashing what is written to it
+class HashingFile:
+	def __init__(self, f):
+		self.f = f
+		self.hash = hashlib.sha256()
+		self.size = 0
+
+	def write(self, data):
+		self.hash.update(data)
+		self.size += len(data)
+		return self.f.write(data)
+
+# Store what write(file) writes unless an identical blob exists, and return the blob's path. The content is hashed
+# while it is written to a temporary file in the store, renamed to its blob once its digest is known.
+def putStream(directory, write, extension):
+	temporaryDir = os.path.join(directory, "blobs", "tmp")
+	os.makedirs(temporaryDir, exist_ok=True)
+	temporary = os.path.join(temporaryDir, "%d.%d.tmp" % (os.getpid(), threading.get_ident()))
+	try:
+		with open(temporary, "wb") as f:
+			sink = HashingFile(f)
+			write(sink)
+		path = blobPath(directory, sink.hash.hexdigest() + extension)
+		if exists(path):
+			stats.count("blobs_reused")
+			return path
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		os.replace(temporary, path)
+	finally:
+		if os.path.exists(temporary):
+			os.remove(temporary)
+	stats.count("bytes_written", sink.size)
+	stats.count("blobs_written")
+	with knownLock:
+		known.add(path)
+	return path
+
+# Zip blobs ({name: path}) in memory, reading each blob a chunk at a time
+def bundle(files):
+	buffer = BytesIO()
+	with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+		for name in sorted(files):
+			info = zipfile.ZipInfo(name, ZIP_DATE)
+			info.external_attr = 0o644 << 16
+			info.compress_type = zipfile.ZIP_DEFLATED
+			with open(files[name], "rb") as source, archive.open(info, "w") as target:
+				shutil.copyfileobj(source, target)
+	return buffer.getvalue()
+
+# Read the current version of a service directory, or None
+def currentVersion(manifestDir):
+	with knownLock:
+		if manifestDir in versions:
+			return versions[manifestDir]
+	try:
+		with open(os.path.join(manifestDir, "current"), "r") as f:
+			version = f.read().strip()
+	except IOError:
+		return None
+	with knownLock:
+		versions[manifestDir] = version
+	return version
+
+# Store the files of a service ({name: content, or function writing it to a binary file}) and record them as its current version.
+# Return the path of the artifact to publish, made of the published files (all of them by default):
+# the file itself, or the zip bundle of several files.
+def putService(directory, service, targetNamespace, files, published=None):
+	published = sorted(files if published is None else published)
+	manifest = {"service": service, "targetNamespace": targetNamespace, "files": {}, "published": published}
+	for name, content in files.items():
+		extension = os.path.splitext(name)[1]
+		path = putStream(directory, content, extension) if callable(content) else putBlob(directory, content, extension)
+		manifest["files"][name] = os.path.basename(path)
+	version = digest(json.dumps(manifest, sort_keys=True).encode("utf-8"))[:16]
+	manifestDir = serviceDir(directory, service, targetNamespace)
+	manifestPath = os.path.join(manifestDir, version + ".json")
+
+	with knownLock:
+		artifact = manifests.get(manifestPath)
+	if artifact is None:
+		if len(published) == 1:
+			artifact = manifest["files"][published[0]]
+		if not os.path.exists(manifestPath):
+			if artifact is None:
+				artifact = os.path.basename(putBlob(directory, bundle(dict((name, blobPath(directory, manifest["files"][name])) for name in published)), ".zip"))
+			manifest["artifact"] = artifact
+			manifest["version"] = version
+			writeAtomic(manifestPath, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+		elif artifact is None:
+			# The bundle of an existing version is named in its manifest, so it isn't zipped again
+			with open(manifestPath, "r") as f:
+				artifact = json.load(f)["artifact"]
+		with knownLock:
+			manifests[manifestPath] = artifact
+
+	if currentVersion(manifestDir) != version:
+		writeAtomic(os.path.join(manifestDir, "current"), version.encode("utf-8"))
+		with knownLock:
+			versions[manifestDir] = version
+	return blobPath(directory, artifact)
+
+# Return the artifact of the current version of a service, or None if it was never stored
+def currentArtifact(directory, service, targetNamespace):
+	manifestDir = serviceDir(directory, service, targetNamespace)
+	version = currentVersion(manifestDir)
+	if version is None:
+		return None
+	with open(os.path.join(manifestDir, version + ".json"), "r") as f:
+		return blobPath(directory, json.load(f)["artifact"])
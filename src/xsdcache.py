@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+# xsdcache.py
+
+# Libraries
+from lxml import etree
+from urllib.parse import urlparse, urljoin
+from concurrent.futures import ThreadPoolExecutor
+import os, json, hashlib, threading, time, re
+import stats, fetch
+
+# Directory holding schemas fetched by previous runs; None keeps the cache in memory only
+CACHE_DIR = None
+
+XSD_NS = "http://www.w3.org/2001/XMLSchema"
+
+# Schemas loaded at once by loadAll
+LOAD_WORKERS = 8
+
+# Children declared by a complexType
+FIELDS = etree.XPath("xsd:sequence/xsd:element | xsd:all/xsd:element | xsd:choice/xsd:element", namespaces={"xsd": XSD_NS})
+
+# Seconds before a schema that couldn't be read is tried again
+RETRY_AFTER = 60
+
+# Parsed schemas of this run, keyed by schemaLocation (None when the schema couldn't be read)
+schemas = {}
+# Time of the last failed load of the schemas that couldn't be read
+failures = {}
+schemasLock = threading.Lock()
+locationLocks = {}
+
+# Return the lock serializing loads of one schemaLocation
+def locationLock(schemaLocation):
+	with schemasLock:
+		if schemaLocation not in locationLocks:
+			locationLocks[schemaLocation] = threading.Lock()
+		return locationLocks[schemaLocation]
+
+# Return the on-disk cache paths (metadata, content) of a remote schema
+def cachePaths(schemaLocation):
+	key = hashlib.sha1(schemaLocation.encode("utf-8")).hexdigest()
+	return os.path.join(CACHE_DIR, key + ".json"), os.path.join(CACHE_DIR, key + ".xsd")
+
+# Read a remote schema from the disk cache
+def readCache(schemaLocation):
+	if CACHE_DIR is None:
+		return None, None
+	metaPath, contentPath = cachePaths(schemaLocation)
+	try:
+		with open(metaPath, "r") as f:
+			meta = json.load(f)
+		with open(contentPath, "rb") as f:
+			content = f.read()
+	except (IOError, ValueError):
+		return None, None
+	if meta.get("schemaLocation") != schemaLocation:
+		return None, None
+	return meta, content
+
+# Write a remote schema to the disk cache
+def writeCache(schemaLocation, meta, content):
+	if CACHE_DIR is None:
+		return
+	metaPath, contentPath = cachePaths(schemaLocation)
+	try:
+		if not os.path.exists(CACHE_DIR):
+			os.makedirs(CACHE_DIR)
+		with open(contentPath, "wb") as f:
+			f.write(content)
+		with open(metaPath, "w") as f:
+			json.dump(meta, f)
+	except IOError as e:
+		print("Warning: couldn't cache schema \"" + schemaLocation + "\": " + str(e))
+
+# Return the freshness lifetime in seconds allowed by a Cache-Control header
+def maxAge(cacheControl):
+	if cacheControl is None or "no-cache" in cacheControl or "no-store" in cacheControl:
+		return 0
+	match = re.search(r"max-age=(\d+)", cacheControl)
+	return int(match.group(1)) if match else 0
+
+# Fetch a remote schema, revalidating the disk cache with ETag/Last-Modified
+def fetchSchema(schemaLocation):
+	meta, content = readCache(schemaLocation)
+	if meta is not None and meta.get("expires", 0) > time.time():
+		return content
+
+	headers = {}
+	if meta is not None:
+		if meta.get("etag"):
+			headers["If-None-Match"] = meta["etag"]
+		if meta.get("lastModified"):
+			headers["If-Modified-Since"] = meta["lastModified"]
+	response = fetch.default().get(schemaLocation, headers)
+	stats.count("xsd_fetches")
+	if response.status_code == 304 and meta is not None:
+		meta["expires"] = time.time() + maxAge(response.headers.get("Cache-Control", meta.get("cacheControl")))
+		writeCache(schemaLocation, meta, content)
+		return content
+	response.raise_for_status()
+
+	meta = {
+		"schemaLocation": schemaLocation,
+		"etag": response.headers.get("ETag"),
+		"lastModified": response.headers.get("Last-Modified"),
+		"cacheControl": response.headers.get("Cache-Control"),
+		"expires": time.time() + maxAge(response.headers.get("Cache-Control")),
+	}
+	if meta["etag"] or meta["lastModified"] or meta["expires"] > time.time():
+		writeCache(schemaLocation, meta, response.content)
+	return response.content
+
+# Return the local name of a QName attribute value such as "xsd:string"
+def localName(value):
+	return value.rsplit(":", 1)[-1] if value is not None else None
+
+# Return the (name, type, minOccurs) of the children declared by a complexType
+def fieldsOf(complexType):
+	fields = []
+	for element in FIELDS(complexType):
+		name = element.get("name") or localName(element.get("ref"))
+		fields.append((name, localName(element.get("type")), element.get("minOccurs", "1")))
+	return tuple(fields)
+
+# Index the top-level element declarations of the documents of a schema, [(root, targetNamespace)], by
+# namespace-qualified name. Each maps to the children of its complexType, inline or named in any of the documents,
+# or None when it has none.
+def indexElements(documents):
+	types = {}
+	for root, targetNamespace in documents:
+		for complexType in root.iterchildren("{%s}complexType" % XSD_NS):
+			types[complexType.get("name")] = fieldsOf(complexType)
+	elements = {}
+	for root, targetNamespace in documents:
+		for element in root.iterchildren("{%s}element" % XSD_NS):
+			complexType = element.find("{%s}complexType" % XSD_NS)
+			if complexType is not None:
+				fields = fieldsOf(complexType)
+			else:
+				fields = types.get(localName(element.get("type")))
+			elements[etree.QName(targetNamespace, element.get("name")).text] = fields
+	return elements
+
+# Resolves the schemas a schema includes or imports: from the documents already read for it, or for remote ones with
+# the fetcher and the disk cache, as libxml2 can't fetch https
+class SchemaResolver(etree.Resolver):
+	def __init__(self):
+		etree.Resolver.__init__(self)
+		self.contents = {}
+
+	def resolve(self, url, id, context):
+		if url in self.contents:
+			return self.resolve_string(self.contents[url], context, base_url=url)
+		if urlparse(url).scheme in ("http", "https"):
+			return self.resolve_string(fetchSchema(url), context, base_url=url)
+		return None
+
+# Read the content of a schema from its URL or file name
+def readSchema(schemaLocation):
+	if urlparse(schemaLocation).scheme != "":
+		return fetchSchema(schemaLocation)
+	with open(schemaLocation, "rb") as f:
+		return f.read()
+
+# Return the documents of a schema and of every schema it includes or imports, with their target namespace; an
+# included schema without one takes the namespace of the schema including it. Locations resolve against the
+# location of the document naming them, and the content read for each is kept by the resolver.
+def schemaDocuments(root, schemaLocation, parser, resolver):
+	documents = [(root, root.get("targetNamespace"), schemaLocation)]
+	seen = set([schemaLocation])
+	for document, targetNamespace, location in documents:
+		for reference in document.iterchildren("{%s}include" % XSD_NS, "{%s}import" % XSD_NS):
+			if not reference.get("schemaLocation"):
+				continue
+			url = urljoin(location, reference.get("schemaLocation").strip())
+			if url in seen:
+				continue
+			seen.add(url)
+			try:
+				content = readSchema(url)
+				referenced = etree.fromstring(content, parser, base_url=url)
+			except Exception:
+				# Compiling the schema reports what can't be read
+				continue
+			resolver.contents[url] = content
+			namespace = referenced.get("targetNamespace")
+			if namespace is None and reference.tag == "{%s}include" % XSD_NS:
+				namespace = targetNamespace
+			documents.append((referenced, namespace, url))
+	return [(document, targetNamespace) for document, targetNamespace, location in documents]
+
+# Load, parse, compile and index a schema. It is parsed with its location as base URL, also when read from the disk
+# cache, so the schemas it includes or imports by relative location are found and indexed with it.
+def loadSchema(schemaLocation):
+	content = readSchema(schemaLocation)
+	parser = etree.XMLParser()
+	resolver = SchemaResolver()
+	parser.resolvers.add(resolver)
+	root = etree.fromstring(content, parser, base_url=schemaLocation)
+	schema = {"content": content, "targetNamespace": root.get("targetNamespace"), "elements": indexElements(schemaDocuments(root, schemaLocation, parser, resolver)), "schema": None, "error": None}
+	try:
+		schema["schema"] = etree.XMLSchema(root)
+	except etree.XMLSchemaParseError as e:
+		schema["error"] = str(e)
+	return schema
+
+# Check whether schemaLocation is cached; a schema that couldn't be read is only cached for RETRY_AFTER seconds
+def isCached(schemaLocation):
+	if schemaLocation not in schemas:
+		return False
+	return schemas[schemaLocation] is not None or time.monotonic() - failures.get(schemaLocation, 0) < RETRY_AFTER
+
+# Return the cached schema of schemaLocation, or None if it can't be read. A schema is a dictionary of its
+# "content" bytes, "targetNamespace", "elements" index, compiled "schema" and the "error" that kept it from compiling.
+def getSchema(schemaLocation):
+	if isCached(schemaLocation):
+		stats.count("xsd_cache_hits")
+		return schemas[schemaLocation]
+	with locationLock(schemaLocation):
+		if not isCached(schemaLocation):
+			stats.count("xsd_cache_misses")
+			try:
+				with stats.timed("xsd_load"):
+					schema = loadSchema(schemaLocation)
+			except Exception as e:
+				print("Error while reading schema \"" + schemaLocation + "\": " + str(e))
+				failures[schemaLocation] = time.monotonic()
+				schemas[schemaLocation] = None
+			else:
+				failures.pop(schemaLocation, None)
+				schemas[schemaLocation] = schema
+		else:
+			stats.count("xsd_cache_hits")
+	return schemas[schemaLocation]
+
+# Load every schema of locations that isn't loaded yet, in parallel
+def loadAll(locations):
+	missing = set(location for location in locations if not isCached(location))
+	if len(missing) > 1:
+		with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(missing))) as executor:
+			list(executor.map(getSchema, missing))
+	elif missing:
+		getSchema(missing.pop())
+	return dict((location, schemas[location]) for location in locations)
@@ -0,0 +1,16 @@
+# coding=utf-8
+
+# The modules live in src/ and import each other by name
+import os, sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src")
+sys.path.insert(0, os.path.abspath(SRC))
+
+import pytest
+import fetch
+
+# Close the fetcher a test may have created through fetch.default(), with its connections
+@pytest.fixture(autouse=True)
+def closeFetcher():
+	yield
+	fetch.close()
@@ -0,0 +1,44 @@
+# coding=utf-8
+
+# Tests of batch runs against pages served locally
+
+# Libraries
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import functools, os, threading
+import pytest
+import hextract, stats
+from test_hextract import CONFIG, PAGE
+
+class PageHandler(SimpleHTTPRequestHandler):
+	def log_message(self, *args):
+		pass
+
+# A run directory whose ../ paths stay in tmp_path, with a config, a page served locally and the list of its URL
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+	site = tmp_path / "site"
+	site.mkdir()
+	(site / "api.html").write_text(PAGE)
+	server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(PageHandler, directory=str(site)))
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	(tmp_path / "run").mkdir()
+	monkeypatch.chdir(tmp_path / "run")
+	# Runs enable the stats of the whole process
+	monkeypatch.setattr(stats, "enabled", False)
+	monkeypatch.setattr(stats, "profileDir", None)
+	(tmp_path / "config.ini").write_text(CONFIG)
+	(tmp_path / "urls.txt").write_text("http://127.0.0.1:%d/api.html\n" % server.server_address[1])
+	yield ["../urls.txt", "--config", "../config.ini", "--state", "../state.json"]
+	server.shutdown()
+	server.server_close()
+
+def test_profile_needs_one_thread(run):
+	with pytest.raises(SystemExit):
+		hextract.runBatch(run + ["--profile", "../profile", "--workers", "2"])
+
+# With worker processes, each page is profiled in the process extracting it
+@pytest.mark.parametrize("options", [["--workers", "1"], ["--workers", "2", "--processes", "1"]])
+def test_profile(run, options):
+	assert hextract.runBatch(run + ["--profile", "../profile"] + options)
+	assert [name for name in os.listdir("../profile") if name.endswith("api.html.prof")]
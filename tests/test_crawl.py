@@ -0,0 +1,76 @@
+# coding=utf-8
+
+# Tests of crawling a static site served locally
+
+# Libraries
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import functools, threading
+import pytest
+import crawl, fetch
+from test_hextract import PAGE, loadConfig
+
+SITE = {
+	"robots.txt": "User-agent: *\nDisallow: /private/\n",
+	"index.html": '<html><body><a href="docs/">Docs</a> <a href="private/api.html">Private</a> <a href="hidden.html" rel="nofollow">Hidden</a> <a href="style.css">Style</a> <a href="http://other.example.com/">Other</a></body></html>',
+	"docs/index.html": '<html><body><a href="../api.html#top">API</a> <a href="./deep.html">Deep</a></body></html>',
+	"docs/deep.html": '<html><body><a href="../deeper.html">Deeper</a></body></html>',
+	"deeper.html": PAGE,
+	"api.html": PAGE,
+	"hidden.html": PAGE,
+	"private/api.html": PAGE,
+	"style.css": "body {}",
+}
+
+class SiteHandler(SimpleHTTPRequestHandler):
+	def log_message(self, *args):
+		pass
+
+@pytest.fixture
+def site(tmp_path):
+	root = tmp_path / "site"
+	for name, content in SITE.items():
+		(root / name).parent.mkdir(parents=True, exist_ok=True)
+		(root / name).write_text(content)
+	server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SiteHandler, directory=str(root)))
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield "http://127.0.0.1:%d/" % server.server_address[1]
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def crawler(site, tmp_path):
+	fetcher = fetch.Fetcher(perHost=2, timeout=5, retries=1, backoff=0)
+	def create(**options):
+		return crawl.Crawler([loadConfig(tmp_path)], fetcher, path=str(tmp_path / "crawl.json"), delay=0, log=lambda line: None, **options)
+	yield create
+	fetcher.close()
+
+def test_crawl(site, crawler):
+	instance = crawler(maxDepth=2)
+	instance.seed([site])
+	found = instance.run(workers=2)
+	# deeper.html is three links away, private/ is disallowed and hidden.html isn't followed
+	assert found == {site + "api.html": 2}
+	assert site + "style.css" not in instance.seen
+	assert instance.failed == 0
+
+# An interrupted crawl resumes with the frontier it saved
+def test_resume(site, crawler):
+	first = crawler(maxDepth=3, maxPages=2)
+	first.seed([site])
+	first.run(workers=1)
+	assert first.crawled == 2
+	assert first.frontier
+
+	second = crawler(maxDepth=3)
+	assert second.load()
+	found = second.run(workers=2)
+	assert found == {site + "api.html": 2, site + "deeper.html": 3}
+	# The disallowed page counts as crawled, without being fetched
+	assert second.crawled == 6
+
+def test_normalize():
+	assert crawl.normalize("HTTP://Example.com:80/a/./b/../c?x=1#frag") == "http://example.com/a/c?x=1"
+	assert crawl.normalize("mailto:someone@example.com") is None
+	assert crawl.normalize("../d", "https://example.com:8443/a/b/c") == "https://example.com:8443/a/d"
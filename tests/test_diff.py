@@ -0,0 +1,38 @@
+# coding=utf-8
+
+# Tests of comparing extracted contracts
+
+# Libraries
+import diff, model
+
+def service(*operations):
+	return model.Service([model.Operation(name, method, endpoint, None, model.Message(name + "Request", [model.Param("id", type)]), model.Message(name + "Response")) for name, method, endpoint, type in operations])
+
+def test_unchanged():
+	resources = service(("getThing", "GET", "http://example.com/things", "int"))
+	assert diff.compare(diff.snapshot(resources), diff.snapshot(resources)) == {}
+
+def test_changed():
+	old = diff.snapshot(service(("getThing", "GET", "http://example.com/things", "int"), ("delThing", "DELETE", "http://example.com/things", "int")))
+	new = diff.snapshot(service(("getThing", "POST", "http://example.com/things", "string"), ("addThing", "POST", "http://example.com/things", "int")))
+	report = diff.compare(old, new)
+	assert report["added"] == ["addThing"]
+	assert report["removed"] == ["delThing"]
+	assert report["changed"]["getThing"]["method"] == ["GET", "POST"]
+	assert report["changed"]["getThing"]["input"]["changedParams"] == {"id": {"type": ["int", "string"]}}
+	assert diff.summarize(report) == "+1 -1 ~1 operations"
+
+# Operations sharing a name on different endpoints are all kept and compared with their counterpart
+def test_shared_name():
+	old = service(("thing", "GET", "http://example.com/a", "int"), ("thing", "GET", "http://example.com/b", "int"))
+	new = service(("thing", "GET", "http://example.com/b", "string"), ("thing", "GET", "http://example.com/a", "int"), ("thing", "PUT", "http://example.com/a", "int"))
+	contract = diff.loads(diff.dumps(diff.snapshot(new)))
+	assert len(contract["thing"]) == 3
+	report = diff.compare(diff.snapshot(old), contract)
+	assert report == {"added": ["thing PUT http://example.com/a"], "changed": {"thing GET http://example.com/b": {"input": {"changedParams": {"id": {"type": ["int", "string"]}}}}}}
+
+# Snapshots recorded by earlier versions held one operation per name
+def test_earlier_snapshot():
+	resources = service(("getThing", "GET", "http://example.com/things", "int"))
+	earlier = dict((name, entries[0]) for name, entries in diff.snapshot(resources).items())
+	assert diff.compare(earlier, diff.snapshot(resources)) == {}
@@ -0,0 +1,90 @@
+# coding=utf-8
+
+# Tests of the fetcher against a stub server
+
+# Libraries
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import socket, threading, time
+import pytest
+import fetch, hextract
+
+class StubHandler(BaseHTTPRequestHandler):
+	# Answer /flaky with a 503 the first time, /down with a 503 always and /slow after a delay
+	def do_GET(self):
+		with self.server.lock:
+			self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+			hits = self.server.hits[self.path]
+		if self.path == "/slow":
+			time.sleep(0.3)
+		status = 503 if self.path == "/down" or (self.path == "/flaky" and hits == 1) else 200
+		content = ("%s %d" % (self.path, hits)).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "text/plain; charset=utf-8")
+		self.send_header("Content-Length", str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+	def log_message(self, *args):
+		pass
+
+@pytest.fixture
+def stub():
+	server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+	server.hits = {}
+	server.lock = threading.Lock()
+	server.url = "http://127.0.0.1:%d" % server.server_address[1]
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def fetcher():
+	instance = fetch.Fetcher(perHost=4, timeout=5, retries=3, backoff=0)
+	yield instance
+	instance.close()
+
+def test_retries(stub, fetcher):
+	response = fetcher.get(stub.url + "/flaky")
+	assert response.status_code == 200
+	assert response.text == "/flaky 2"
+
+# The last response is returned once every attempt failed
+def test_retries_exhausted(stub, fetcher):
+	response = fetcher.get(stub.url + "/down")
+	assert response.status_code == 503
+	assert stub.hits["/down"] == 3
+	with pytest.raises(fetch.FetchError):
+		response.raise_for_status()
+
+def test_deduplicates(stub, fetcher):
+	responses = fetcher.getAll([stub.url + "/slow"] * 5)
+	assert [response.text for response in responses] == ["/slow 1"] * 5
+	assert stub.hits["/slow"] == 1
+
+def test_unreachable(fetcher):
+	with socket.socket() as unused:
+		unused.bind(("127.0.0.1", 0))
+		port = unused.getsockname()[1]
+	with pytest.raises(fetch.FetchError):
+		fetcher.get("http://127.0.0.1:%d/" % port)
+
+# A download to a file is retried like any request, and its body is read from the file
+def test_getFile(stub, fetcher):
+	response = fetcher.getFile(stub.url + "/flaky")
+	assert response.status_code == 200
+	assert response.content == b""
+	assert response.file.read() == b"/flaky 2"
+	response.file.close()
+
+# Streamed pages are downloaded by the shared fetcher
+def test_openStream(stub, monkeypatch):
+	monkeypatch.setattr(fetch, "RETRY_BACKOFF", 0)
+	source = hextract.openStream(stub.url + "/page")
+	assert source.read() == b"/page 1"
+	source.close()
+	assert fetch.shared is not None
+	with pytest.raises(fetch.FetchError):
+		hextract.openStream(stub.url + "/down")
+	assert stub.hits["/down"] == fetch.FETCH_RETRIES
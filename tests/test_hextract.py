@@ -0,0 +1,121 @@
+# coding=utf-8
+
+# Tests of extraction and WSDL 2.0 rendering on small pages
+
+# Libraries
+from lxml import etree
+from io import BytesIO
+import os
+import pytest
+import hextract, model, settings
+
+CONFIG = """[XPATH QUERIES]
+service=//div[contains(@class, 'service')]
+operation=//*[contains(@class, 'operation')]
+method=//*[contains(@class, 'method')]
+endpoint=//*[contains(@class, 'endpoint')]
+input=//*[contains(@class, 'input')]
+output=//*[contains(@class, 'output')]
+param=//*[contains(@class, 'param')]
+
+[WSDL 2.0 ATTRIBUTES]
+serviceName=Test
+targetNamespace=http://example.com/test
+
+[CUSTOM ATTRIBUTES]
+operationName=id
+binding=data-binding
+type=data-type
+minOccurs=data-minoccurs
+maxOccurs=data-maxoccurs
+message=data-message
+"""
+
+OPERATION = """<div class="operation" id="%s">
+<span class="method">%s</span> <span class="endpoint">http://example.com/%s</span>
+<div class="input"><span class="param" data-type="int">id</span><span class="param" data-minoccurs="0">filter</span></div>
+<div class="output"><span class="param" data-type="dateTime">created</span></div>
+</div>"""
+
+PAGE = """<html><body><h1>Test API</h1>
+<div class="service">%s</div>
+</body></html>""" % (OPERATION % ("getThing", "GET", "things") + OPERATION % ("addThing", "POST", "things"))
+
+REPO_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "config", "config.ini")
+
+WSDL_NS = "http://www.w3.org/ns/wsdl"
+
+def loadConfig(tmp_path, text=CONFIG):
+	path = tmp_path / "config.ini"
+	path.write_text(text)
+	return settings.load(str(path))
+
+def test_renderWSDL2(tmp_path):
+	config = loadConfig(tmp_path)
+	resources = hextract.extract(PAGE, config)
+	root = etree.fromstring(hextract.renderWSDL2(resources, config))
+	assert root.tag == "{%s}description" % WSDL_NS
+	assert [op.get("name") for op in root.iterfind("{%s}interface/{%s}operation" % (WSDL_NS, WSDL_NS))] == ["getThing", "addThing"]
+	assert root.find("{%s}service/{%s}endpoint" % (WSDL_NS, WSDL_NS)).get("address") == "http://example.com/things"
+
+# An import sharing the target namespace must not hide the tns prefix the document refers to
+def test_renderWSDL2_declares_tns():
+	config = settings.load(REPO_CONFIG)
+	assert config["importedXsd"]["msg0"][0] == config["targetNamespace"]
+	resources = model.Service([model.Operation("getInvoices", "GET", "http://localhost:3000/invoices", None, model.Message("msg1:getInvoicesRequest"), model.Message("msg0:getInvoicesResponse")),
+		model.Operation("addInvoice", "POST", "http://localhost:3000/invoices", None, model.Message("addInvoiceRequest", [model.Param("id", "int")]), model.Message("addInvoiceResponse"))])
+	root = etree.fromstring(hextract.renderWSDL2(resources, config))
+	assert root.nsmap["tns"] == config["targetNamespace"]
+	# Every message QName resolves with the prefixes in scope
+	elements = {}
+	for op in root.iterfind("{%s}interface/{%s}operation" % (WSDL_NS, WSDL_NS)):
+		elements[op.get("name")] = [etree.QName(op.nsmap[prefix], name).text for prefix, name in (message.get("element").split(":") for message in op)]
+	assert elements["getInvoices"] == ["{http://localhost:3000/invoices2}getInvoicesRequest", "{http://localhost:3000/invoices}getInvoicesResponse"]
+	assert elements["addInvoice"] == ["{http://localhost:3000/invoices}addInvoiceRequest", "{http://localhost:3000/invoices}addInvoiceResponse"]
+
+def test_extractStream(tmp_path):
+	config = loadConfig(tmp_path)
+	streamed = hextract.extractStream(BytesIO(PAGE.encode("utf-8")), config)
+	assert streamed.asDict() == hextract.html2resourcesxpath(PAGE, config).asDict()
+
+# Operations outside the first service aren't streamed
+def test_extractStream_service_only(tmp_path):
+	config = loadConfig(tmp_path)
+	page = PAGE.replace("</body>", '<div class="service">%s</div>%s</body>' % (OPERATION % ("delThing", "DELETE", "things"), OPERATION % ("putThing", "PUT", "things")))
+	page = page.replace("<h1>", OPERATION % ("headThing", "HEAD", "things") + "<h1>")
+	streamed = hextract.extractStream(BytesIO(page.encode("utf-8")), config)
+	assert [op.name for op in streamed.operations] == ["getThing", "addThing"]
+
+def test_extractStream_missing_service(tmp_path):
+	config = loadConfig(tmp_path)
+	with pytest.raises(hextract.ExtractionError) as error:
+		hextract.extractStream(BytesIO(PAGE.replace("service", "api").encode("utf-8")), config)
+	assert error.value.code == "missing-service"
+
+def test_extractStream_service_path(tmp_path):
+	config = loadConfig(tmp_path, CONFIG.replace("service=//div[contains(@class, 'service')]", "service=/html/body"))
+	streamed = hextract.extractStream(BytesIO(PAGE.encode("utf-8")), config)
+	assert [op.name for op in streamed.operations] == ["getThing", "addThing"]
+
+# A prefixed message name needs an imported XSD, also when the config imports none
+def test_unknown_prefix(tmp_path):
+	config = loadConfig(tmp_path)
+	assert not config["importedXsd"]
+	page = PAGE.replace('<div class="output">', '<div class="output" data-message="xs:thingResponse">')
+	with pytest.raises(hextract.ExtractionError) as error:
+		hextract.extract(page, config)
+	assert error.value.code == "unknown-xsd-prefix"
+
+# Elements are tested at their start tag, before their children and text are parsed
+def test_extractStream_unstreamable(tmp_path):
+	for key, query in (("operation", "//div[span[contains(@class, 'method')]]"), ("operation", "//div[@id][2]"), ("service", "//div[contains(., 'Test')]"), ("service", "//div/div")):
+		config = loadConfig(tmp_path, CONFIG.replace(key + "=" + ("//*[contains(@class, 'operation')]" if key == "operation" else "//div[contains(@class, 'service')]"), key + "=" + query))
+		with pytest.raises(hextract.ExtractionError) as error:
+			hextract.extractStream(BytesIO(PAGE.encode("utf-8")), config)
+		assert error.value.code == "unstreamable-query"
+
+# Only the first service is extracted, so a service query may pick it with [1]
+def test_extractStream_first_service(tmp_path):
+	config = loadConfig(tmp_path, CONFIG.replace("service=//div[contains(@class, 'service')]", "service=//div[contains(@class, 'service')][1]"))
+	streamed = hextract.extractStream(BytesIO(PAGE.encode("utf-8")), config)
+	assert [op.name for op in streamed.operations] == ["getThing", "addThing"]
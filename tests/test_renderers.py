@@ -0,0 +1,40 @@
+# coding=utf-8
+
+# Tests of the OpenAPI and JSON Schema renderers
+
+# Libraries
+import json, subprocess, sys
+import model, renderers
+from test_hextract import loadConfig
+from conftest import SRC
+
+def test_unknown_prefix_schema(tmp_path):
+	config = loadConfig(tmp_path)
+	schema = renderers.messageSchema(model.Message("xs:thing", [model.Param("id", "int")]), config)
+	assert schema["properties"] == {"id": {"type": "integer", "format": "int32"}}
+	assert schema["xml"] == {"name": "thing", "namespace": "http://example.com/test"}
+
+def operation(name, method, endpoint):
+	return model.Operation(name, method, endpoint, None, model.Message(name + "Request", [model.Param("id", "int")]), model.Message(name + "Response"))
+
+def test_openapi_paths(tmp_path):
+	config = loadConfig(tmp_path)
+	resources = model.Service([operation("getInvoices", "GET", "http://example.com/invoices"), operation("getInvoice", "GET", "http://example.com/invoices?format=xml"),
+		operation("addInvoice", "POST", "http://example.com/invoices"), operation("getOther", "GET", "http://other.example.com/invoices")])
+	document = json.loads(renderers.renderOpenAPI(resources, config))
+	assert list(document["paths"]) == ["/invoices"]
+	item = document["paths"]["/invoices"]
+	assert item["get"]["operationId"] == "getInvoices"
+	assert item["get"]["servers"] == [{"url": "http://example.com"}]
+	assert item["post"]["operationId"] == "addInvoice"
+	extra = dict((entry["operationId"], entry) for entry in item["x-operations"])
+	assert sorted(extra) == ["getInvoice", "getOther"]
+	assert extra["getInvoice"]["x-method"] == "GET"
+	assert extra["getInvoice"]["parameters"][0] == {"name": "format", "in": "query", "required": True, "schema": {"const": "xml"}}
+	assert extra["getOther"]["servers"] == [{"url": "http://other.example.com"}]
+	assert "servers" not in document
+
+# The WSDL 2.0 renderer is found without importing hextract first
+def test_wsdl_registered(tmp_path):
+	script = "import renderers\nassert renderers.parseFormats('wsdl,openapi') == ['wsdl', 'openapi']\nassert renderers.fileName('wsdl', {'serviceName': 'Test'}) == 'Test.wsdl'\n"
+	subprocess.run([sys.executable, "-c", script], cwd=SRC, check=True)
@@ -0,0 +1,58 @@
+# coding=utf-8
+
+# Tests of publishing to a stub registry
+
+# Libraries
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import threading
+import pytest
+import save, settings
+
+class RegistryHandler(BaseHTTPRequestHandler):
+	def do_POST(self):
+		self.rfile.read(int(self.headers["Content-Length"]))
+		self.server.uploads.append(self.headers["Content-Type"])
+		# The first upload is answered as by an overloaded registry
+		status = 503 if len(self.server.uploads) == 1 else 200
+		self.send_response(status)
+		self.send_header("Content-Length", "0")
+		self.end_headers()
+
+	def log_message(self, *args):
+		pass
+
+@pytest.fixture
+def registry():
+	server = ThreadingHTTPServer(("127.0.0.1", 0), RegistryHandler)
+	server.uploads = []
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def saveIni(tmp_path, monkeypatch):
+	monkeypatch.setattr(save, "saveTemplate", None)
+	return tmp_path / "save.ini"
+
+def test_readSave_missing_endpoint(saveIni):
+	saveIni.write_text("[API]\nendpoint=\n")
+	with pytest.raises(settings.ConfigError):
+		save.readSave(str(saveIni))
+
+def test_readSave_missing_file(saveIni):
+	with pytest.raises(settings.ConfigError):
+		save.readSave(str(saveIni))
+	# A default file is left to fill in
+	assert "endpoint=" in saveIni.read_text()
+
+def test_publishArtifacts_retries(registry, saveIni, tmp_path):
+	saveIni.write_text("[API]\nendpoint=http://127.0.0.1:%d/upload\n\n[DATA]\nfilename={filename}\n" % registry.server_address[1])
+	save.loadSave(str(saveIni))
+	artifact = tmp_path / "0123abcd.wsdl"
+	artifact.write_bytes(b"<description/>")
+	result = save.publishArtifacts([(str(artifact), "Test.wsdl")], workers=1, backoff=0)[0]
+	assert result["ok"]
+	assert result["attempts"] == 2
+	assert all(contentType.startswith("multipart/form-data") for contentType in registry.uploads)
@@ -0,0 +1,86 @@
+# coding=utf-8
+
+# Tests of the extraction server's answers
+
+# Libraries
+from http.client import HTTPConnection
+import json, socket, threading
+import pytest
+import hextract, server
+from test_hextract import PAGE, loadConfig
+
+@pytest.fixture
+def extractionServer(tmp_path):
+	instance = server.createServer("127.0.0.1", 0, [loadConfig(tmp_path)])
+	thread = threading.Thread(target=instance.serve_forever, daemon=True)
+	thread.start()
+	yield instance
+	instance.shutdown()
+	instance.server_close()
+
+def post(instance, body, path="/extract"):
+	connection = HTTPConnection(*instance.server_address[:2])
+	connection.request("POST", path, body)
+	response = connection.getresponse()
+	content = json.loads(response.read())
+	connection.close()
+	return response.status, content
+
+def test_extract(extractionServer):
+	status, content = post(extractionServer, PAGE)
+	assert status == 200
+	assert [op["name"] for op in content["resources"]["operations"]] == ["getThing", "addThing"]
+
+def get(instance, path):
+	connection = HTTPConnection(*instance.server_address[:2])
+	connection.request("GET", path)
+	response = connection.getresponse()
+	content = json.loads(response.read())
+	connection.close()
+	return response.status, content
+
+# Every stage of a request is timed, and /stats reports the percentiles of each
+def test_stats(extractionServer):
+	for i in range(3):
+		assert post(extractionServer, PAGE)[0] == 200
+	status, content = get(extractionServer, "/stats")
+	assert status == 200
+	assert sorted(content) == sorted(server.STAGES)
+	assert content["fetch"] == {"count": 0}
+	for stage in ("extract", "render", "total"):
+		assert content[stage]["count"] == 3
+		assert 0 <= content[stage]["p50"] <= content[stage]["p90"] <= content[stage]["p95"] <= content[stage]["p99"] <= content[stage]["max"]
+
+def test_get_unknown_path(extractionServer):
+	status, content = get(extractionServer, "/unknown")
+	assert status == 404
+	assert content["error"] == "Unknown path /unknown."
+
+def test_percentile():
+	values = [float(i) for i in range(1, 101)]
+	assert [server.percentile(values, p) for p in (50, 90, 99, 100)] == [50.0, 90.0, 99.0, 100.0]
+	assert server.percentile([1.0], 99) == 1.0
+
+def test_invalid_content_length(extractionServer):
+	with socket.create_connection(extractionServer.server_address[:2]) as connection:
+		connection.sendall(b"POST /extract HTTP/1.1\r\nHost: localhost\r\nContent-Length: many\r\n\r\n")
+		answer = connection.makefile("rb").read()
+	assert answer.startswith(b"HTTP/1.1 400")
+	assert b"Invalid Content-Length" in answer
+
+# A body posted to an unknown path is never served as a request of its own
+def test_unknown_path(extractionServer):
+	smuggled = b"GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n"
+	with socket.create_connection(extractionServer.server_address[:2], timeout=5) as connection:
+		connection.sendall(b"POST /unknown HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n" % len(smuggled) + smuggled)
+		answer = connection.makefile("rb").read()
+	assert answer.startswith(b"HTTP/1.1 404")
+	assert answer.count(b"HTTP/1.1 ") == 1
+
+def test_internal_error(extractionServer, monkeypatch):
+	def fail(document, config):
+		raise RuntimeError("boom")
+	monkeypatch.setattr(hextract, "extract", fail)
+	status, content = post(extractionServer, PAGE)
+	assert status == 500
+	assert "boom" in content["error"]
@@ -0,0 +1,40 @@
+# coding=utf-8
+
+# Tests of the content-addressed store
+
+# Libraries
+import os, zipfile
+from io import BytesIO
+import hextract, renderers, store
+from test_hextract import PAGE, loadConfig
+
+# A document written to the store is named and deduplicated as the same bytes stored at once
+def test_putStream(tmp_path):
+	directory = str(tmp_path)
+	path = store.putStream(directory, lambda f: (f.write(b"<a>"), f.write(b"</a>")), ".xml")
+	assert path == store.putBlob(directory, b"<a></a>", ".xml")
+	assert store.putStream(directory, lambda f: f.write(b"<a></a>"), ".xml") == path
+	with open(path, "rb") as f:
+		assert f.read() == b"<a></a>"
+	assert os.listdir(os.path.join(directory, "blobs", "tmp")) == []
+
+def test_putService_bundle(tmp_path):
+	directory = str(tmp_path)
+	artifact = store.putService(directory, "Test", "http://example.com/test", {"Test.wsdl": lambda f: f.write(b"<description/>"), "test.xsd": b"<schema/>"})
+	with zipfile.ZipFile(artifact) as archive:
+		assert archive.read("Test.wsdl") == b"<description/>"
+		assert archive.read("test.xsd") == b"<schema/>"
+
+# generate writes the WSDL 2.0 document to the store instead of rendering it in memory
+def test_generate_streams_wsdl(tmp_path, monkeypatch):
+	config = loadConfig(tmp_path)
+	resources = hextract.extract(PAGE, config)
+	def fail(resources, config):
+		raise AssertionError("rendered in memory")
+	monkeypatch.setattr(renderers.available()["wsdl"], "render", fail)
+	artifact = hextract.generate(resources, config, ["wsdl", "openapi"], outputDir=str(tmp_path / "out"))
+	sink = BytesIO()
+	hextract.writeWSDL2(resources, config, sink)
+	with open(artifact, "rb") as f:
+		assert f.read() == sink.getvalue()
+	assert os.path.basename(artifact) == store.digest(sink.getvalue()) + ".wsdl"
@@ -0,0 +1,88 @@
+# coding=utf-8
+
+# Tests of loading schemas, retrying those that couldn't be read and resolving those they include
+
+# Libraries
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import functools, threading
+import pytest
+import hextract, xsdcache
+
+MAIN = """<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="http://example.com/things" targetNamespace="http://example.com/things">
+<xsd:include schemaLocation="types/common.xsd"/>
+<xsd:element name="thing" type="tns:Thing"/>
+</xsd:schema>"""
+
+COMMON = """<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" targetNamespace="http://example.com/things">
+<xsd:import namespace="http://example.com/units" schemaLocation="units.xsd"/>
+<xsd:complexType name="Thing"><xsd:sequence><xsd:element name="id" type="xsd:int"/></xsd:sequence></xsd:complexType>
+<xsd:element name="thingResponse"><xsd:complexType><xsd:sequence><xsd:element name="created" type="xsd:dateTime" minOccurs="0"/></xsd:sequence></xsd:complexType></xsd:element>
+</xsd:schema>"""
+
+UNITS = """<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" targetNamespace="http://example.com/units">
+<xsd:element name="unit" type="xsd:string"/>
+</xsd:schema>"""
+
+# Elements of the schema and of those it includes and imports, with the fields of their types wherever declared
+ELEMENTS = {
+	"{http://example.com/things}thing": (("id", "int", "1"),),
+	"{http://example.com/things}thingResponse": (("created", "dateTime", "0"),),
+	"{http://example.com/units}unit": None,
+}
+
+class SchemaHandler(SimpleHTTPRequestHandler):
+	def end_headers(self):
+		self.send_header("Cache-Control", "max-age=3600")
+		SimpleHTTPRequestHandler.end_headers(self)
+
+	def log_message(self, *args):
+		pass
+
+@pytest.fixture
+def schemaDir(tmp_path, monkeypatch):
+	monkeypatch.setattr(xsdcache, "schemas", {})
+	monkeypatch.setattr(xsdcache, "failures", {})
+	root = tmp_path / "site"
+	(root / "types").mkdir(parents=True)
+	(root / "main.xsd").write_text(MAIN)
+	(root / "types" / "common.xsd").write_text(COMMON)
+	(root / "types" / "units.xsd").write_text(UNITS)
+	return root
+
+@pytest.fixture
+def schemaServer(schemaDir):
+	server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SchemaHandler, directory=str(schemaDir)))
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield "http://127.0.0.1:%d" % server.server_address[1]
+	server.shutdown()
+	server.server_close()
+
+# A schema that couldn't be read is loaded again once RETRY_AFTER seconds have passed
+def test_getSchema_retries(tmp_path, monkeypatch):
+	monkeypatch.setattr(xsdcache, "schemas", {})
+	monkeypatch.setattr(xsdcache, "failures", {})
+	monkeypatch.setattr(xsdcache, "RETRY_AFTER", 0)
+	location = str(tmp_path / "late.xsd")
+	assert xsdcache.getSchema(location) is None
+	with open(location, "w") as f:
+		f.write('<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" targetNamespace="http://example.com/late"><xsd:element name="thing"/></xsd:schema>')
+	assert xsdcache.getSchema(location)["targetNamespace"] == "http://example.com/late"
+	assert location not in xsdcache.failures
+
+def test_local_include(schemaDir):
+	schema = xsdcache.getSchema(str(schemaDir / "main.xsd"))
+	assert schema["error"] is None
+	assert schema["schema"] is not None
+	assert schema["elements"] == ELEMENTS
+	assert hextract.messageExistInXSD("thingResponse", str(schemaDir / "main.xsd"), "http://example.com/things")
+
+# Includes resolve against the schema's URL whether it was fetched or read from the disk cache
+def test_remote_include(schemaServer, tmp_path, monkeypatch):
+	monkeypatch.setattr(xsdcache, "CACHE_DIR", str(tmp_path / "cache"))
+	location = schemaServer + "/main.xsd"
+	assert xsdcache.getSchema(location)["error"] is None
+	xsdcache.schemas.clear()
+	schema = xsdcache.getSchema(location)
+	assert schema["error"] is None
+	assert schema["elements"] == ELEMENTS